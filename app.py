@@ -1,13 +1,12 @@
-import os
 import io
+import json
 import base64
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, List, Tuple
 
-import numpy as np
 from fastapi import FastAPI, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from starlette.requests import Request
 from PIL import Image
@@ -15,10 +14,13 @@ import uvicorn
 from ultralytics import YOLO
 
 from utils.predict_bounding_boxes import predict_bounding_boxes
-from utils.manga_ocr_utils import get_text_from_image
-from utils.translate_manga import translate_manga
-from utils.process_contour import process_contour
+from utils.manga_ocr_utils import OCR_BATCH_SIZE, OCR_INPUT_SPEC, get_text_from_tensors
+from utils.crop_preparation import prepare_crops
+from utils.translate_manga import translate_batch
+from utils.bubble_cleaning import clean_bubble, select_cleaning_tier
 from utils.write_text_on_image import add_text
+from utils.image_loading import ImageTooLargeError, decode_base64_image, build_detection_proxy, scale_boxes
+from utils.memory_usage import track_peak_memory
 
 MODEL_PATH = "./model_creation/runs/detect/train5/weights/best.pt"
 object_detection_model = YOLO(MODEL_PATH)
@@ -37,31 +39,65 @@ app.mount("/fonts", StaticFiles(directory="fonts"), name="fonts")
 templates = Jinja2Templates(directory="templates")
 
 
-def decode_base64_image(encoded_image: str) -> Image.Image:
-    decoded_bytes = base64.b64decode(encoded_image)
-    image = Image.open(io.BytesIO(decoded_bytes))
-    return image.convert("RGB")
+def detect_regions(encoded_image: str) -> Tuple[Image.Image, List]:
+    """
+    Decode the uploaded page and detect its bubbles on a downscaled proxy,
+    mapping the boxes back to the full page.
+    """
+    image = decode_base64_image(encoded_image)
 
+    proxy, scale = build_detection_proxy(image)
+    results = predict_bounding_boxes(object_detection_model, proxy)
+    return image, scale_boxes(results, scale, image.size)
 
-def extract_text_from_regions(image: np.ndarray, results: list) -> Dict[str, Any]:
-    image_info = {"detected_language": "auto", "translated_language": "en", "bounding_boxes": [], "text": [], "translated_text": []}
 
-    for result in results:
-        x1, y1, x2, y2, _, _ = result
-        detected_image = image[int(y1):int(y2), int(x1):int(x2)]
-        if detected_image.shape[-1] == 4:
-            detected_image = detected_image[:, :, :3]
-        im = Image.fromarray(np.uint8(detected_image * 255))
-        text = get_text_from_image(im)
+def new_image_info() -> Dict[str, Any]:
+    return {"detected_language": "auto", "translated_language": "en", "bounding_boxes": [], "text": [], "translated_text": []}
 
-        processed_image, cont = process_contour(detected_image)
-        translated_text = translate_manga(text, source_lang="auto", target_lang="en")
-        add_text(processed_image, translated_text, cont)
 
-        image_info["bounding_boxes"].append(result)
-        image_info["text"].append(text)
-        image_info["translated_text"].append(translated_text)
+def iter_region_events(image: Image.Image, results: list, image_info: Dict[str, Any]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Translate each detected region in place, filling image_info and yielding an
+    event as each bubble's OCR text and translation become available.
+    Only the bubble crops are copied out of the page, so the page itself stays
+    the single full-resolution buffer. Bubbles are read and translated one OCR
+    batch at a time, so the first translations arrive before the last bubbles are read.
+    """
+    cleaning_tier = select_cleaning_tier(results)
+    image_info["cleaning_tier"] = cleaning_tier
 
+    # Color and grayscale crops and OCR inputs for every bubble, built once for the page
+    prepared = prepare_crops(image, results, OCR_INPUT_SPEC)
+
+    for start in range(0, len(results), OCR_BATCH_SIZE):
+        texts = get_text_from_tensors(prepared.ocr_input[start:start + OCR_BATCH_SIZE])
+
+        bubbles = []
+        for index, text in enumerate(texts, start):
+            box = prepared.boxes[index]
+            processed_image, cont = clean_bubble(prepared.color[index], cleaning_tier, prepared.gray_crop(index))
+            bubbles.append((box, processed_image, cont))
+
+            image_info["bounding_boxes"].append(results[index])
+            image_info["text"].append(text)
+            yield "text", {"index": index, "text": text}
+
+        translated_texts = translate_batch(texts, source_lang="auto", target_lang="en")
+        image_info["translated_text"].extend(translated_texts)
+
+        for index, ((box, processed_image, cont), translated_text) in enumerate(zip(bubbles, translated_texts), start):
+            yield "translation", {"index": index, "translated_text": translated_text}
+            processed_image = add_text(processed_image, translated_text, cont)
+            image.paste(Image.fromarray(processed_image), box[:2])
+
+
+def extract_text_from_regions(image: Image.Image, results: list) -> Dict[str, Any]:
+    """
+    Translate each detected region in place and return the collected image info.
+    """
+    image_info = new_image_info()
+    for _ in iter_region_events(image, results, image_info):
+        pass
     return image_info
 
 
@@ -79,23 +115,22 @@ def home(request: Request):
 @app.post("/predict")
 def predict(request: Dict[str, Any]):
     try:
-        image = decode_base64_image(request["image"])
-        image.save("image.png")
-
-        results = predict_bounding_boxes(object_detection_model, "image.png")
-        np_image = np.array(image)
-        image_info = extract_text_from_regions(np_image, results)
-
-        result_image = Image.fromarray(np_image, 'RGB')
-        result_image.save("translated_image.png")
+        with track_peak_memory() as memory:
+            image, results = detect_regions(request["image"])
+            image_info = extract_text_from_regions(image, results)
+            img_str = convert_image_to_base64(image)
 
-        img_str = convert_image_to_base64(result_image)
-
-        os.remove("image.png")
-        os.remove("translated_image.png")
+        image_info["process_peak_memory_mb"] = memory["process_peak_memory_mb"]
 
         return {"image": img_str, "image_info": image_info}
 
+    except ImageTooLargeError as e:
+        print(e)
+        return JSONResponse(
+            status_code=413,
+            content={"code": status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, "message": "Image Too Large"}
+        )
+
     except Exception as e:
         print(e)
         return JSONResponse(
@@ -104,5 +139,46 @@ def predict(request: Dict[str, Any]):
         )
 
 
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/predict/stream")
+def predict_stream(request: Dict[str, Any]):
+    """
+    Server-Sent Events version of /predict. Emits the detected boxes right after
+    detection, then each bubble's OCR text and translation, and finally the
+    composited image, so the client can show results while rendering continues.
+    """
+    def events() -> Iterator[str]:
+        try:
+            with track_peak_memory() as memory:
+                image, results = detect_regions(request["image"])
+                yield format_sse("boxes", {"width": image.width, "height": image.height, "bounding_boxes": results})
+
+                image_info = new_image_info()
+                for event, data in iter_region_events(image, results, image_info):
+                    yield format_sse(event, data)
+
+                img_str = convert_image_to_base64(image)
+
+            image_info["process_peak_memory_mb"] = memory["process_peak_memory_mb"]
+            yield format_sse("image", {"image": img_str, "image_info": image_info})
+
+        except ImageTooLargeError as e:
+            print(e)
+            yield format_sse("error", {"code": status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, "message": "Image Too Large"})
+
+        except Exception as e:
+            print(e)
+            yield format_sse("error", {"code": status.HTTP_500_INTERNAL_SERVER_ERROR, "message": "Internal Server Error"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 if __name__ == "__main__":
     uvicorn.run("app:app", host="localhost", port=8000, reload=True)
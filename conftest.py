@@ -0,0 +1 @@
+# Makes the repository root importable, so the tests can import utils and metrics with plain `pytest`
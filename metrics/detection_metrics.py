@@ -0,0 +1,129 @@
+"""Métricas de detecção por caixa: IoU, precisão, revocação, F1 e mAP@[.5:.95]"""
+import os
+import numpy as np
+
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+# Pontos de revocação usados na interpolação do AP, como no COCO
+RECALL_POINTS = np.linspace(0, 1, 101)
+
+
+def box_iou(boxes_a, boxes_b):
+    """Calcula a matriz de IoU (N, M) entre dois conjuntos de caixas (x1, y1, x2, y2)"""
+    boxes_a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+    boxes_b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+
+    area_a = np.prod(np.clip(boxes_a[:, 2:] - boxes_a[:, :2], 0, None), axis=1)
+    area_b = np.prod(np.clip(boxes_b[:, 2:] - boxes_b[:, :2], 0, None), axis=1)
+    union = area_a[:, None] + area_b[None, :] - intersection
+
+    return intersection / np.maximum(union, 1e-9)
+
+
+def load_yolo_labels(label_path, image_size):
+    """Carrega caixas no formato YOLO (classe cx cy w h normalizados) como (x1, y1, x2, y2) em pixels
+
+    Um arquivo ausente gera FileNotFoundError, para que um caminho errado no manifesto
+    não vire uma página sem caixas. Um arquivo vazio é uma página sem balões.
+    """
+    if not os.path.isfile(label_path):
+        raise FileNotFoundError(f"Arquivo de rótulos não encontrado: {label_path}")
+
+    with open(label_path, 'r', encoding='utf-8') as f:
+        lines = [line for line in f if line.strip()]
+    if not lines:
+        return np.zeros((0, 4))
+
+    labels = np.loadtxt(lines, ndmin=2)
+
+    width, height = image_size
+    cx, cy, w, h = labels[:, 1] * width, labels[:, 2] * height, labels[:, 3] * width, labels[:, 4] * height
+    return np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+
+
+def match_detections(predicted_boxes, predicted_scores, ground_truth_boxes, iou_thresholds=IOU_THRESHOLDS):
+    """Pareia as predições com as caixas reais de forma gulosa, por ordem de confiança.
+
+    Retorna uma matriz booleana (T, N) indicando, para cada limiar de IoU, quais
+    predições (na ordem recebida) são verdadeiros positivos. Cada caixa real só
+    pode ser usada uma vez por limiar.
+    """
+    iou_thresholds = np.asarray(iou_thresholds)
+    num_predictions = len(predicted_boxes)
+    true_positives = np.zeros((len(iou_thresholds), num_predictions), dtype=bool)
+    if num_predictions == 0 or len(ground_truth_boxes) == 0:
+        return true_positives
+
+    ious = box_iou(predicted_boxes, ground_truth_boxes)
+    matched = np.zeros((len(iou_thresholds), ious.shape[1]), dtype=bool)
+
+    # Todos os limiares são resolvidos juntos para cada predição
+    for i in np.argsort(-np.asarray(predicted_scores), kind="stable"):
+        candidates = np.where(matched, -1.0, ious[i][None, :])
+        best = candidates.argmax(axis=1)
+        hit = candidates[np.arange(len(iou_thresholds)), best] >= iou_thresholds
+        true_positives[hit, i] = True
+        matched[hit, best[hit]] = True
+
+    return true_positives
+
+
+def average_precision(true_positives, scores, num_ground_truth):
+    """Calcula o AP para cada limiar a partir dos acertos de todas as páginas (interpolação de 101 pontos)"""
+    num_thresholds = true_positives.shape[0]
+    if num_ground_truth == 0 or true_positives.shape[1] == 0:
+        return np.zeros(num_thresholds)
+
+    order = np.argsort(-scores, kind="stable")
+    tp = np.cumsum(true_positives[:, order], axis=1)
+    fp = np.cumsum(~true_positives[:, order], axis=1)
+    recall = tp / num_ground_truth
+    precision = tp / np.maximum(tp + fp, 1e-9)
+
+    # Envelope da precisão: máximo à direita de cada ponto
+    precision = np.flip(np.maximum.accumulate(np.flip(precision, axis=1), axis=1), axis=1)
+
+    ap = np.zeros(num_thresholds)
+    for t in range(num_thresholds):
+        indices = np.searchsorted(recall[t], RECALL_POINTS, side="left")
+        valid = indices < precision.shape[1]
+        ap[t] = np.sum(precision[t, indices[valid]]) / len(RECALL_POINTS)
+    return ap
+
+
+def evaluate_detections(pages, iou_thresholds=IOU_THRESHOLDS):
+    """Calcula precisão, revocação, F1 (IoU 0.5), mAP@.5 e mAP@[.5:.95] sobre um conjunto de páginas.
+
+    Cada página é uma tupla (caixas preditas, confianças, caixas reais).
+    """
+    iou_thresholds = np.asarray(iou_thresholds)
+    all_true_positives = []
+    all_scores = []
+    num_ground_truth = 0
+
+    for predicted_boxes, predicted_scores, ground_truth_boxes in pages:
+        all_true_positives.append(match_detections(predicted_boxes, predicted_scores, ground_truth_boxes, iou_thresholds))
+        all_scores.append(np.asarray(predicted_scores, dtype=np.float64).reshape(-1))
+        num_ground_truth += len(ground_truth_boxes)
+
+    true_positives = np.concatenate(all_true_positives, axis=1) if all_true_positives else np.zeros((len(iou_thresholds), 0), dtype=bool)
+    scores = np.concatenate(all_scores) if all_scores else np.zeros(0)
+
+    # Precisão e revocação no limiar de IoU 0.5
+    hits = int(true_positives[0].sum())
+    precision = hits / true_positives.shape[1] if true_positives.shape[1] else 0.0
+    recall = hits / num_ground_truth if num_ground_truth else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+
+    ap = average_precision(true_positives, scores, num_ground_truth)
+
+    return {
+        "precision": precision,
+        "recall": recall,
+        "f1": f1,
+        "map50": float(ap[0]),
+        "map50_95": float(ap.mean()),
+    }
@@ -3,48 +3,156 @@ from PIL import Image
 import matplotlib.pyplot as plt
 from nltk.translate.bleu_score import sentence_bleu
 from skimage.metrics import structural_similarity as ssim
-import json
+import time
 from datetime import datetime
 import os
 import difflib
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
+import hashlib
+import tempfile
+from scipy.optimize import linear_sum_assignment
+from detection_metrics import evaluate_detections
+from metrics_store import MetricsStore
+
+EMBEDDING_MODEL_NAME = "paraphrase-multilingual-MiniLM-L12-v2"
+EMBEDDING_BATCH_SIZE = 64
+# Intervalo mínimo em segundos entre duas gerações automáticas do gráfico
+PLOT_MIN_INTERVAL = 300
+
+
+def _normalize_bubbles(bubbles):
+    """Textos dos balões em minúsculas e sem espaços nas pontas, ignorando os vazios"""
+    return [text.lower().strip() for text in bubbles if text and text.strip()]
 
 
 class TRUEslatorMetrics:
     def __init__(self):
+        # Arquivo JSON antigo, importado uma única vez para o banco
         self.metrics_file = "metrics/reports/metrics_history.json"
+        self.metrics_db = "metrics/reports/metrics_history.db"
         self.plot_file = "metrics/plots/metrics_evolution.png"
+        self.embedding_cache_file = "metrics/cache/embeddings.npz"
+        # Se o último save_metrics regenerou o gráfico
+        self.plot_updated = False
         self._ensure_directories()
-        self.metrics_history = self._load_metrics_history()
-        # Inicializa o modelo de embeddings
-        self.embedding_model = SentenceTransformer(
-            "paraphrase-multilingual-MiniLM-L12-v2"
-        )
+        self.store = MetricsStore(self.metrics_db)
+        self.store.migrate_json(self.metrics_file)
+        # O modelo de embeddings e o cache são carregados só quando necessários
+        self._embedding_model = None
+        self._embedding_cache = None
+
+    @property
+    def embedding_model(self):
+        """Carrega o modelo de embeddings no primeiro uso"""
+        if self._embedding_model is None:
+            from sentence_transformers import SentenceTransformer
+
+            self._embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+        return self._embedding_model
 
     def _ensure_directories(self):
         """Garante que os diretórios necessários existam"""
         os.makedirs("metrics/reports", exist_ok=True)
         os.makedirs("metrics/plots", exist_ok=True)
 
-    def _load_metrics_history(self):
-        """Carrega o histórico de métricas do arquivo JSON"""
-        try:
-            with open(self.metrics_file, "r") as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return []
+    @property
+    def metrics_history(self):
+        """Histórico completo de métricas, em ordem cronológica"""
+        return self.store.query()
+
+    def _embedding_key(self, text):
+        """Chave do cache de embeddings para um texto"""
+        return hashlib.sha256(f"{EMBEDDING_MODEL_NAME}\n{text}".encode("utf-8")).hexdigest()
+
+    def _load_embedding_cache(self):
+        """Carrega o cache de embeddings do disco"""
+        if self._embedding_cache is None:
+            try:
+                with np.load(self.embedding_cache_file) as data:
+                    self._embedding_cache = {key: data[key] for key in data.files}
+            except (FileNotFoundError, ValueError, OSError):
+                self._embedding_cache = {}
+        return self._embedding_cache
+
+    def encode_texts(self, texts, use_cache=False):
+        """Gera embeddings normalizados em lote; com use_cache, reaproveita os já salvos em disco"""
+        if not use_cache:
+            return self.embedding_model.encode(
+                list(texts),
+                batch_size=EMBEDDING_BATCH_SIZE,
+                normalize_embeddings=True,
+                convert_to_numpy=True,
+            )
+
+        cache = self._load_embedding_cache()
+        keys = [self._embedding_key(text) for text in texts]
+        missing = list(dict.fromkeys(key for key in keys if key not in cache))
+
+        if missing:
+            texts_by_key = dict(zip(keys, texts))
+            embeddings = self.encode_texts([texts_by_key[key] for key in missing])
+            cache.update(zip(missing, embeddings))
+
+            # Arquivo temporário único no mesmo diretório, para que avaliadores concorrentes
+            # não sobrescrevam o arquivo um do outro antes do os.replace atômico
+            cache_dir = os.path.dirname(self.embedding_cache_file)
+            os.makedirs(cache_dir, exist_ok=True)
+            fd, tmp_file = tempfile.mkstemp(dir=cache_dir, suffix=".npz.tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    np.savez(f, **cache)
+                os.replace(tmp_file, self.embedding_cache_file)
+            except BaseException:
+                os.remove(tmp_file)
+                raise
+
+        if not keys:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack([cache[key] for key in keys])
 
     def calculate_semantic_similarity(self, text1, text2):
         """Calcula a similaridade semântica entre dois textos usando embeddings"""
-        # Gera embeddings para os textos
-        embedding1 = self.embedding_model.encode([text1])
-        embedding2 = self.embedding_model.encode([text2])
+        # Gera os dois embeddings em um único lote
+        embedding1, embedding2 = self.encode_texts([text1, text2])
 
-        # Calcula similaridade de cosseno
-        similarity = cosine_similarity(embedding1, embedding2)[0][0]
+        # Com embeddings normalizados, a similaridade de cosseno é o produto escalar
+        similarity = float(embedding1 @ embedding2)
         return max(0, similarity)  # Normaliza para [0, 1]
 
+    def calculate_bubble_translation_quality(self, pages):
+        """Calcula a qualidade da tradução balão a balão para várias páginas de uma vez.
+
+        Recebe uma lista de pares (traduções dos balões, balões de referência) e retorna
+        uma pontuação por página. Todas as traduções e referências são codificadas em
+        lotes, e as referências ficam em cache no disco. Em cada página os balões são
+        pareados pela maior similaridade total (algoritmo húngaro) e a soma é dividida
+        pelo maior número de balões, penalizando balões faltando ou sobrando.
+        """
+        pages = [(_normalize_bubbles(hypotheses), _normalize_bubbles(references)) for hypotheses, references in pages]
+
+        hypothesis_embeddings = self.encode_texts([text for hypotheses, _ in pages for text in hypotheses])
+        reference_embeddings = self.encode_texts(
+            [text for _, references in pages for text in references], use_cache=True
+        )
+
+        scores = []
+        hyp_start = ref_start = 0
+        for hypotheses, references in pages:
+            hyp = hypothesis_embeddings[hyp_start:hyp_start + len(hypotheses)]
+            ref = reference_embeddings[ref_start:ref_start + len(references)]
+            hyp_start += len(hypotheses)
+            ref_start += len(references)
+
+            if len(hyp) == 0 or len(ref) == 0:
+                scores.append(0.0)
+                continue
+
+            # Matriz de similaridade de cosseno entre todos os balões da página
+            similarity = np.clip(hyp @ ref.T, 0, 1)
+            rows, cols = linear_sum_assignment(similarity, maximize=True)
+            scores.append(float(similarity[rows, cols].sum() / max(len(hyp), len(ref))))
+
+        return scores
+
     def calculate_translation_quality(self, translated_text, reference_text):
         """Calcula a qualidade da tradução usando similaridade semântica baseada em embeddings"""
         # Normaliza os textos
@@ -54,25 +162,29 @@ class TRUEslatorMetrics:
         # Calcula similaridade semântica usando embeddings
         return self.calculate_semantic_similarity(translated_text, reference_text)
 
-    def calculate_inpainting_quality(self, original_img, inpainted_img):
-        """Calcula a qualidade do inpainting usando SSIM"""
+    def calculate_inpainting_quality(self, original_img, inpainted_img, ignore_mask=None):
+        """Calcula a qualidade do inpainting usando SSIM
+
+        Com ignore_mask, a média do SSIM considera apenas os pixels fora da máscara,
+        medindo o dano causado ao balão e à arte em vez da remoção do texto.
+        """
         # Converter imagens para arrays numpy e garantir mesmo tamanho
         original_array = np.array(original_img.convert("L"))
         inpainted_array = np.array(inpainted_img.convert("L").resize(original_img.size))
 
         # Calcular SSIM
-        score, _ = ssim(original_array, inpainted_array, full=True)
+        score, ssim_map = ssim(original_array, inpainted_array, full=True)
+        if ignore_mask is not None and not ignore_mask.all():
+            score = ssim_map[~ignore_mask].mean()
         return max(0, score)  # Normalizar para [0, 1]
 
-    def calculate_text_detection_rate(self, reference_text, extracted_text):
+    def calculate_text_detection_rate(self, original_text, extracted_text):
         """Calcula a taxa de detecção usando similaridade de caracteres e análise léxica"""
-        if not reference_text or not extracted_text:
+        if not original_text or not extracted_text:
             return 0.0
 
         # Normalização e preparação dos textos
-        # Carregar texto original japonês para comparação
-        with open("ground_truth/raw/1.txt", "r", encoding="utf-8") as f:
-            original_jp = f.read().lower().strip()
+        original_jp = original_text.lower().strip()
 
         # Comparar OCR com original japonês
         ocr = extracted_text.lower().strip()
@@ -118,6 +230,12 @@ class TRUEslatorMetrics:
 
         return max(0, min(final_score, 1))  # Garante valor entre 0-1
 
+    def calculate_detection_metrics(self, predicted_boxes, ground_truth_boxes, predicted_scores=None):
+        """Calcula precisão, revocação, F1 e mAP das caixas preditas contra as anotadas"""
+        if predicted_scores is None:
+            predicted_scores = np.ones(len(predicted_boxes))
+        return evaluate_detections([(predicted_boxes, predicted_scores, ground_truth_boxes)])
+
     def calculate_overall_score(self, metrics):
         """Calcula a pontuação geral combinando todas as métricas"""
         weights = {
@@ -142,18 +260,16 @@ class TRUEslatorMetrics:
             return [self._convert_to_native_types(item) for item in obj]
         return obj
 
-    def evaluate_and_save(
+    def evaluate(
         self,
         original_text,
+        extracted_text,
         translated_text,
         reference_text,
         original_img,
         inpainted_img,
-        predicted_boxes=None,
-        ground_truth_boxes=None,
     ):
-        """Avalia todas as métricas e salva os resultados"""
-        # Calcular métricas individuais
+        """Avalia todas as métricas de uma página sem salvar no histórico"""
         metrics = {
             "translation_quality": self.calculate_translation_quality(
                 translated_text, reference_text
@@ -162,49 +278,90 @@ class TRUEslatorMetrics:
                 original_img, inpainted_img
             ),
             "text_detection_rate": self.calculate_text_detection_rate(
-                reference_text, original_text
+                original_text, extracted_text
             ),
         }
 
         # Calcular pontuação geral
         metrics["overall_score"] = self.calculate_overall_score(metrics)
 
+        return self._convert_to_native_types(metrics)
+
+    def save_metrics(self, metrics, force_plot=False):
+        """Adiciona um registro ao histórico, salva e atualiza o gráfico
+
+        Com force_plot=True, o gráfico é regenerado mesmo que tenha sido gerado há pouco.
+        """
         # Adicionar timestamp
         metrics["timestamp"] = datetime.now().isoformat()
 
         # Converter valores numpy para tipos nativos do Python
         metrics = self._convert_to_native_types(metrics)
 
-        # Atualizar histórico
-        self.metrics_history.append(metrics)
-
-        # Salvar histórico atualizado
-        with open(self.metrics_file, "w") as f:
-            json.dump(self.metrics_history, f, indent=2)
+        # Adicionar ao histórico com uma inserção atômica
+        metrics = self.store.append(metrics)
 
-        # Gerar gráfico de evolução
-        self._plot_metrics_evolution()
+        # Atualizar o gráfico de evolução, no máximo a cada PLOT_MIN_INTERVAL segundos
+        self.plot_updated = self.plot_metrics_evolution(force=force_plot)
 
         return metrics
 
-    def _plot_metrics_evolution(self):
-        """Gera um gráfico mostrando a evolução das métricas ao longo do tempo"""
-        if not self.metrics_history:
-            return
+    def evaluate_and_save(
+        self,
+        original_text,
+        translated_text,
+        reference_text,
+        original_img,
+        inpainted_img,
+        predicted_boxes=None,
+        ground_truth_boxes=None,
+        cleaning_tiers=None,
+        extracted_text=None,
+    ):
+        """Avalia todas as métricas e salva os resultados"""
+        metrics = self.evaluate(
+            original_text,
+            extracted_text if extracted_text is not None else original_text,
+            translated_text,
+            reference_text,
+            original_img,
+            inpainted_img,
+        )
+
+        # Métricas de detecção por caixa, se houver caixas anotadas
+        if predicted_boxes is not None and ground_truth_boxes is not None:
+            metrics["detection"] = self.calculate_detection_metrics(
+                predicted_boxes, ground_truth_boxes
+            )
+
+        # SSIM e tempo de cada camada de limpeza dos balões, se avaliados
+        if cleaning_tiers is not None:
+            metrics["cleaning_tiers"] = cleaning_tiers
+
+        return self.save_metrics(metrics)
+
+    def plot_metrics_evolution(self, force=True):
+        """Gera um gráfico mostrando a evolução das métricas ao longo do tempo.
+
+        Com force=False, não faz nada se o gráfico foi gerado há menos de PLOT_MIN_INTERVAL segundos.
+        Retorna se o gráfico foi gerado.
+        """
+        if not force and os.path.exists(self.plot_file):
+            if time.time() - os.path.getmtime(self.plot_file) < PLOT_MIN_INTERVAL:
+                return False
+
+        # Apenas as colunas indexadas, sem decodificar os registros completos
+        history = self.store.query(full=False)
+        if not history:
+            return False
 
         # Preparar dados para o gráfico
-        timestamps = range(len(self.metrics_history))
+        timestamps = range(len(history))
         metrics_data = {
-            "Qualidade da Tradução": [
-                m["translation_quality"] for m in self.metrics_history
-            ],
-            "Qualidade do Inpainting": [
-                m["inpainting_quality"] for m in self.metrics_history
-            ],
-            "Taxa de Detecção": [
-                m["text_detection_rate"] for m in self.metrics_history
-            ],
-            "Pontuação Geral": [m["overall_score"] for m in self.metrics_history],
+            "Qualidade da Tradução": [m["translation_quality"] for m in history],
+            "Qualidade do Inpainting": [m["inpainting_quality"] for m in history],
+            "Taxa de Detecção": [m["text_detection_rate"] for m in history],
+            "Pontuação Geral": [m["overall_score"] for m in history],
         }
 
         # Criar gráfico
@@ -222,3 +379,4 @@ class TRUEslatorMetrics:
         # Salvar gráfico
         plt.savefig(self.plot_file)
         plt.close()
+        return True
@@ -0,0 +1,132 @@
+"""Histórico de métricas em SQLite, somente com inserções, seguro para avaliadores concorrentes"""
+import json
+import os
+import sqlite3
+import uuid
+from contextlib import closing
+
+# Métricas guardadas em colunas próprias para consultas e gráficos sem decodificar o JSON
+METRIC_COLUMNS = ["translation_quality", "inpainting_quality", "text_detection_rate", "overall_score"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS metrics (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL,
+    config_hash TEXT,
+    timestamp TEXT NOT NULL,
+    translation_quality REAL,
+    inpainting_quality REAL,
+    text_detection_rate REAL,
+    overall_score REAL,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_metrics_run_id ON metrics (run_id);
+CREATE INDEX IF NOT EXISTS idx_metrics_config_hash ON metrics (config_hash, timestamp);
+CREATE INDEX IF NOT EXISTS idx_metrics_timestamp ON metrics (timestamp);
+CREATE TABLE IF NOT EXISTS migrations (
+    source TEXT PRIMARY KEY
+);
+"""
+
+
+class MetricsStore:
+    def __init__(self, db_path="metrics/reports/metrics_history.db"):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with closing(self._connect()) as conn:
+            # WAL permite leituras enquanto outro processo insere
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        """Abre uma conexão nova; conexões não são compartilhadas entre threads ou processos"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _insert(self, conn, record):
+        conn.execute(
+            "INSERT INTO metrics (run_id, config_hash, timestamp, "
+            + ", ".join(METRIC_COLUMNS)
+            + ", record) VALUES (?, ?, ?, "
+            + ", ".join("?" for _ in METRIC_COLUMNS)
+            + ", ?)",
+            [record["run_id"], record.get("config_hash"), record.get("timestamp", "")]
+            + [record.get(column) for column in METRIC_COLUMNS]
+            + [json.dumps(record, ensure_ascii=False)],
+        )
+
+    def append(self, record):
+        """Adiciona um registro em uma transação atômica e retorna o registro salvo"""
+        record = {**record, "run_id": record.get("run_id") or uuid.uuid4().hex}
+        with closing(self._connect()) as conn, conn:
+            self._insert(conn, record)
+        return record
+
+    def query(self, run_id=None, config_hash=None, since=None, until=None, limit=None, full=True):
+        """Consulta registros por execução, configuração e intervalo de tempo, em ordem cronológica.
+
+        Com full=False, retorna apenas as colunas indexadas, sem decodificar o registro completo.
+        """
+        conditions, params = [], []
+        for clause, value in [
+            ("run_id = ?", run_id),
+            ("config_hash = ?", config_hash),
+            ("timestamp >= ?", since),
+            ("timestamp <= ?", until),
+        ]:
+            if value is not None:
+                conditions.append(clause)
+                params.append(value)
+
+        sql = "SELECT * FROM metrics"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        if limit is None:
+            sql += " ORDER BY timestamp, id"
+        else:
+            # Os últimos `limit` registros, ainda em ordem cronológica
+            sql = f"SELECT * FROM ({sql} ORDER BY timestamp DESC, id DESC LIMIT ?) ORDER BY timestamp, id"
+            params.append(limit)
+
+        with closing(self._connect()) as conn:
+            rows = conn.execute(sql, params).fetchall()
+
+        if full:
+            return [json.loads(row["record"]) for row in rows]
+        return [{key: row[key] for key in row.keys() if key != "record"} for row in rows]
+
+    def count(self):
+        """Número de registros no histórico"""
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM metrics").fetchone()[0]
+
+    def migrate_json(self, json_path):
+        """Importa uma única vez o histórico do antigo arquivo JSON"""
+        if not os.path.exists(json_path):
+            return 0
+
+        source = os.path.normpath(json_path)
+        with closing(self._connect()) as conn:
+            # BEGIN IMMEDIATE garante que só um processo faça a migração
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if conn.execute("SELECT 1 FROM migrations WHERE source = ?", (source,)).fetchone():
+                    conn.rollback()
+                    return 0
+
+                try:
+                    with open(json_path, "r") as f:
+                        records = json.load(f)
+                except json.JSONDecodeError:
+                    records = []
+
+                for index, record in enumerate(records):
+                    self._insert(conn, {**record, "run_id": record.get("run_id") or f"legacy-{index}"})
+                conn.execute("INSERT INTO migrations (source) VALUES (?)", (source,))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+        return len(records)
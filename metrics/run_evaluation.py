@@ -4,145 +4,419 @@ import os
 # Adiciona o diretório raiz ao PYTHONPATH
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from evaluate_metrics import TRUEslatorMetrics
+from evaluate_metrics import PLOT_MIN_INTERVAL, TRUEslatorMetrics
+from detection_metrics import evaluate_detections, load_yolo_labels
+import argparse
+import hashlib
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from PIL import Image
 import numpy as np
 from ultralytics import YOLO
 from utils.predict_bounding_boxes import predict_bounding_boxes
-from utils.translate_manga import translate_manga
-from utils.manga_ocr_utils import get_text_from_image
-from utils.process_contour import process_contour
+from utils.translate_manga import translate_batch_with_failures
+from utils.bubble_cleaning import available_tiers, clean_bubble, find_text_mask, select_cleaning_tier
+from utils.process_contour import to_grayscale
 from utils.write_text_on_image import add_text
+from utils.crop_preparation import prepare_crops
 
-def process_image(image_path, model):
+MODEL_PATH = "model_creation/runs/detect/train5/weights/best.pt"
+MANIFEST_PATH = "metrics/manifest.json"
+CACHE_DIR = "metrics/cache"
+COMPARISON_DIR = "metrics/comparison"
+METRIC_KEYS = ["translation_quality", "bubble_translation_quality", "inpainting_quality", "text_detection_rate", "overall_score"]
+
+# Código e configurações que alteram as saídas do pipeline guardadas no cache
+PIPELINE_SOURCE_DIR = "utils"
+PIPELINE_ENV_VARS = ["TRANSLATOR_BACKENDS", "LOCAL_TRANSLATOR_MODELS"]
+
+# Modelo de detecção carregado uma vez em cada processo de trabalho
+_worker_model = None
+
+def process_image(image_path, model, cleaning_tier=None):
     """Processa uma imagem usando o pipeline real do TRUEslator"""
+    # Importado aqui para que o Manga-OCR só seja carregado quando há páginas a processar
+    from utils.manga_ocr_utils import OCR_BATCH_SIZE, OCR_INPUT_SPEC, get_text_from_tensors
+
     # Carregar a imagem
     image = np.array(Image.open(image_path))
     original_image = image.copy()
-    
+
     # Prever caixas delimitadoras
     results = predict_bounding_boxes(model, image_path)
+    cleaning_tier = cleaning_tier or select_cleaning_tier(results)
     predicted_boxes = []
+    predicted_scores = []
     extracted_texts = []
-    translated_texts = []
-    
-    for result in results:
+
+    # Prepara em uma única passada os recortes em tons de cinza e as entradas do OCR
+    prepared = prepare_crops(image, results, OCR_INPUT_SPEC)
+
+    # Extrai o texto de todos os balões em lotes
+    for start in range(0, len(results), OCR_BATCH_SIZE):
+        extracted_texts.extend(get_text_from_tensors(prepared.ocr_input[start:start + OCR_BATCH_SIZE]))
+
+    # Traduz todos os balões da página em lote, como o app
+    translated_texts, failed_translations = translate_batch_with_failures(extracted_texts, source_lang='auto', target_lang='en')
+
+    for index, (result, text_translated) in enumerate(zip(results, translated_texts)):
         # Descompacta as coordenadas e outras informações da detecção
-        x1, y1, x2, y2, score, class_id = result
-        predicted_boxes.append((int(x1), int(y1), int(x2), int(y2)))
-        
-        detected_image = image[int(y1):int(y2), int(x1):int(x2)]
-        
-        # Converte a imagem detectada para o formato PIL
-        im = Image.fromarray(np.uint8(detected_image * 255))
-        
-        # Extrai o texto da imagem
-        text = get_text_from_image(im)
-        extracted_texts.append(text)
-        
-        # Processa os contornos da imagem
-        detected_image, cont = process_contour(detected_image)
-        
-        # Traduz o texto extraído
-        text_translated = translate_manga(text, source_lang='auto', target_lang='en')
-        translated_texts.append(text_translated)
-        
+        _, _, _, _, score, class_id = result
+        x1, y1, x2, y2 = prepared.boxes[index]
+        predicted_boxes.append((x1, y1, x2, y2))
+        predicted_scores.append(float(score))
+
+        # Processa os contornos da imagem, usando o recorte já preparado
+        detected_image, cont = clean_bubble(prepared.color[index], cleaning_tier, prepared.gray_crop(index))
+
         # Adiciona o texto traduzido na imagem detectada
         image_with_text = add_text(detected_image, text_translated, cont)
-        
+
         # Substitui a região da imagem original com a versão modificada
-        image[int(y1):int(y2), int(x1):int(x2)] = image_with_text
-    
+        image[y1:y2, x1:x2] = image_with_text
+
     # Converte a imagem final para PIL
     result_image = Image.fromarray(image, 'RGB')
-    
+
     return {
         'predicted_boxes': predicted_boxes,
+        'predicted_scores': predicted_scores,
         'translated_texts': translated_texts,
         'extracted_texts': extracted_texts,
         'result_image': result_image,
-        'original_image': Image.fromarray(original_image, 'RGB')
+        'original_image': Image.fromarray(original_image, 'RGB'),
+        'cleaning_tier': cleaning_tier,
+        # Balões sem texto do OCR ou sem tradução por falha do modelo ou dos tradutores
+        'failed_ocr': sum(1 for text in extracted_texts if text is None),
+        'failed_translations': len(failed_translations)
     }
 
-def load_example_data():
-    """Carrega os dados de exemplo para avaliação usando o pipeline real"""
-    # Carregar modelo de detecção de objetos
-    best_model_path = "model_creation/runs/detect/train5/"
-    object_detection_model = YOLO(os.path.join(best_model_path, "weights/best.pt"))
-    
-    # Processar imagem de exemplo
-    example_image_path = 'validation_example_pages/1.jpg'
-    processed_data = process_image(example_image_path, object_detection_model)
-    
-    # Carregar textos original e de referência
-    with open('ground_truth/raw/1.txt', 'r', encoding='utf-8') as f:
-        original_text = f.read().strip()
-    
-    with open('ground_truth/translated/1.txt', 'r', encoding='utf-8') as f:
-        reference_text = f.read().strip()
-    
-    # Combinar todos os textos traduzidos em um único texto
-    translated_text = ' '.join(processed_data['translated_texts'])
-    extracted_text = ' '.join(processed_data['extracted_texts'])
-    
-    # Carregar ground truth boxes (em um caso real, isso seria anotado manualmente)
-    ground_truth_boxes = [(105, 105, 195, 145), (305, 205, 395, 245)]
-    
-    return {
-        'original_text': original_text,
-        'extracted_text': extracted_text,
-        'translated_text': translated_text,
-        'reference_text': reference_text,
-        'original_img': processed_data['original_image'],
-        'inpainted_img': processed_data['result_image'],
-        'predicted_boxes': processed_data['predicted_boxes'],
-        'ground_truth_boxes': ground_truth_boxes
+def evaluate_cleaning_tiers(original_img, predicted_boxes, evaluator):
+    """Limpa os balões com cada camada de limpeza e mede SSIM e tempo por camada
+
+    O SSIM é calculado fora da máscara dilatada do texto original: remover o texto não
+    é penalizado, apenas as alterações no restante do balão e na arte.
+    """
+    original = np.array(original_img)
+    gray = to_grayscale(original)
+    text_mask = np.zeros(gray.shape, dtype=bool)
+    for x1, y1, x2, y2 in predicted_boxes:
+        text_mask[y1:y2, x1:x2] |= find_text_mask(gray[y1:y2, x1:x2]) > 0
+
+    tiers = {}
+
+    for tier in available_tiers():
+        cleaned = original.copy()
+        start = time.perf_counter()
+
+        for x1, y1, x2, y2 in predicted_boxes:
+            cleaned_region, _ = clean_bubble(cleaned[y1:y2, x1:x2], tier)
+            cleaned[y1:y2, x1:x2] = cleaned_region
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        tiers[tier] = {
+            'ssim': evaluator.calculate_inpainting_quality(original_img, Image.fromarray(cleaned, 'RGB'), text_mask),
+            'time_ms': elapsed_ms,
+            'time_per_bubble_ms': elapsed_ms / max(1, len(predicted_boxes))
+        }
+
+    return tiers
+
+def load_manifest(manifest_path):
+    """Carrega a lista de páginas do manifesto"""
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)['pages']
+
+def _hash_file(path, digest):
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+
+def compute_config_hash(model_path):
+    """Gera um hash do modelo, do código do pipeline e da configuração dos tradutores"""
+    digest = hashlib.sha256()
+    _hash_file(model_path, digest)
+
+    # O próprio script contém process_image, então também entra no hash
+    _hash_file(os.path.abspath(__file__), digest)
+    for root, dirs, files in os.walk(PIPELINE_SOURCE_DIR):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith('.py'):
+                digest.update(name.encode())
+                _hash_file(os.path.join(root, name), digest)
+
+    for name in PIPELINE_ENV_VARS:
+        digest.update(f"{name}={os.environ.get(name, '')}".encode())
+
+    return digest.hexdigest()[:16]
+
+def page_cache_path(page, config_hash):
+    """Caminho do cache de uma página, que muda se a imagem ou a configuração mudarem"""
+    digest = hashlib.sha256(config_hash.encode())
+    _hash_file(page['image'], digest)
+    return os.path.join(CACHE_DIR, str(page['id']), digest.hexdigest()[:16])
+
+def load_cached_outputs(cache_path):
+    """Carrega as saídas do pipeline salvas para uma página, se existirem"""
+    try:
+        with open(os.path.join(cache_path, 'outputs.json'), 'r', encoding='utf-8') as f:
+            outputs = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    if not os.path.exists(os.path.join(cache_path, 'result.png')):
+        return None
+    return outputs
+
+def _init_worker(model_path):
+    """Carrega o modelo de detecção no processo de trabalho"""
+    global _worker_model
+    _worker_model = YOLO(model_path)
+
+def _run_page(page, cache_path):
+    """Executa o pipeline em uma página e salva as saídas no cache
+
+    Saídas degradadas (falha no OCR ou nos tradutores) não são salvas no cache,
+    para que a página seja reprocessada na próxima execução.
+    """
+    start = time.perf_counter()
+    data = process_image(page['image'], _worker_model)
+    runtime = time.perf_counter() - start
+
+    os.makedirs(cache_path, exist_ok=True)
+    data['result_image'].save(os.path.join(cache_path, 'result.png'))
+
+    outputs = {
+        'predicted_boxes': data['predicted_boxes'],
+        'predicted_scores': data['predicted_scores'],
+        'extracted_texts': data['extracted_texts'],
+        'translated_texts': data['translated_texts'],
+        'cleaning_tier': data['cleaning_tier'],
+        'pipeline_seconds': runtime,
+        'degraded': bool(data['failed_ocr'] or data['failed_translations'])
+    }
+
+    outputs_path = os.path.join(cache_path, 'outputs.json')
+    if outputs['degraded']:
+        print(f"Página {page['id']}: {data['failed_ocr']} falhas de OCR e {data['failed_translations']} "
+              f"textos sem tradução; saídas não salvas no cache")
+        # Remove um cache anterior que não corresponde mais ao result.png
+        if os.path.exists(outputs_path):
+            os.remove(outputs_path)
+        return outputs
+
+    # Escrita atômica para que uma execução interrompida não deixe um cache corrompido
+    tmp_path = os.path.join(cache_path, 'outputs.json.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(outputs, f, ensure_ascii=False)
+    os.replace(tmp_path, outputs_path)
+
+    return outputs
+
+def run_pipeline(pages, config_hash, workers=1, use_cache=True):
+    """Executa o pipeline nas páginas sem cache válido, em paralelo, e retorna as saídas por página"""
+    cache_paths = {page['id']: page_cache_path(page, config_hash) for page in pages}
+    outputs = {}
+
+    pending = []
+    for page in pages:
+        cached = load_cached_outputs(cache_paths[page['id']]) if use_cache else None
+        if cached is not None:
+            outputs[page['id']] = {**cached, 'cached': True}
+        else:
+            pending.append(page)
+
+    print(f"{len(pages) - len(pending)} páginas em cache, {len(pending)} a processar")
+    if not pending:
+        return outputs, cache_paths
+
+    if workers <= 1:
+        _init_worker(MODEL_PATH)
+        for page in pending:
+            outputs[page['id']] = {**_run_page(page, cache_paths[page['id']]), 'cached': False}
+        return outputs, cache_paths
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(MODEL_PATH,)) as executor:
+        futures = {executor.submit(_run_page, page, cache_paths[page['id']]): page for page in pending}
+        for future in as_completed(futures):
+            page = futures[future]
+            outputs[page['id']] = {**future.result(), 'cached': False}
+            print(f"Página {page['id']} processada")
+
+    return outputs, cache_paths
+
+def _read_text(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read().strip()
+
+def _read_bubbles(path):
+    """Lê os balões de referência, um por linha"""
+    return [line for line in _read_text(path).splitlines() if line.strip()]
+
+def evaluate_page(evaluator, page, outputs, cache_path, bubble_quality, cleaning_tiers=False):
+    """Calcula as métricas de uma página a partir das saídas do pipeline"""
+    start = time.perf_counter()
+
+    original_img = Image.open(page['image']).convert('RGB')
+    inpainted_img = Image.open(os.path.join(cache_path, 'result.png'))
+
+    # Combinar os textos dos balões em um único texto
+    extracted_text = ' '.join(text for text in outputs['extracted_texts'] if text)
+    translated_text = ' '.join(text for text in outputs['translated_texts'] if text)
+
+    metrics = evaluator.evaluate(
+        original_text=_read_text(page['raw_text']),
+        extracted_text=extracted_text,
+        translated_text=translated_text,
+        reference_text=_read_text(page['reference_text']),
+        original_img=original_img,
+        inpainted_img=inpainted_img
+    )
+    metrics['bubble_translation_quality'] = bubble_quality
+
+    if cleaning_tiers:
+        boxes = [tuple(box) for box in outputs['predicted_boxes']]
+        metrics['cleaning_tiers'] = evaluate_cleaning_tiers(original_img, boxes, evaluator)
+
+    metrics['page_id'] = page['id']
+    metrics['cleaning_tier'] = outputs['cleaning_tier']
+    metrics['cached'] = outputs['cached']
+    metrics['degraded'] = outputs.get('degraded', False)
+    metrics['pipeline_seconds'] = outputs['pipeline_seconds']
+    metrics['evaluation_seconds'] = time.perf_counter() - start
+
+    # Salvar textos para análise manual
+    comparison_dir = os.path.join(COMPARISON_DIR, str(page['id']))
+    os.makedirs(comparison_dir, exist_ok=True)
+    for name, text in [('extracted_text.txt', extracted_text), ('translated_text.txt', translated_text)]:
+        with open(os.path.join(comparison_dir, name), 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    return metrics
+
+def load_ground_truth_boxes(page):
+    """Carrega as caixas anotadas da página (rótulos YOLO), ou None se a página não tiver rótulos"""
+    if not page.get('labels'):
+        return None
+    with Image.open(page['image']) as image:
+        return load_yolo_labels(page['labels'], image.size)
+
+def evaluate_page_detections(pages, outputs):
+    """Calcula as métricas de detecção por página e sobre todas as páginas com rótulos"""
+    detections = {}
+    for page in pages:
+        ground_truth_boxes = load_ground_truth_boxes(page)
+        if ground_truth_boxes is None:
+            continue
+        page_outputs = outputs[page['id']]
+        predicted_boxes = page_outputs['predicted_boxes']
+        scores = page_outputs.get('predicted_scores', [1.0] * len(predicted_boxes))
+        detections[page['id']] = (predicted_boxes, scores, ground_truth_boxes)
+
+    if not detections:
+        return {}, None
+
+    per_page = {page_id: evaluate_detections([detection]) for page_id, detection in detections.items()}
+    return per_page, evaluate_detections(list(detections.values()))
+
+def aggregate_metrics(page_metrics):
+    """Calcula a média de cada métrica e o tempo total sobre o conjunto de páginas
+
+    O tempo do pipeline conta apenas as páginas processadas nesta execução; o tempo
+    original das páginas reaproveitadas do cache é informado à parte.
+    """
+    dataset = {
+        key: float(np.mean([m[key] for m in page_metrics])) if page_metrics else 0.0
+        for key in METRIC_KEYS
     }
+    dataset['num_pages'] = len(page_metrics)
+    dataset['cached_pages'] = sum(1 for m in page_metrics if m['cached'])
+    # Páginas com falha de OCR ou de tradução, cujas métricas não refletem a qualidade do pipeline
+    dataset['degraded_pages'] = sum(1 for m in page_metrics if m['degraded'])
+    dataset['pipeline_seconds'] = sum(m['pipeline_seconds'] for m in page_metrics if not m['cached'])
+    dataset['cached_pipeline_seconds'] = sum(m['pipeline_seconds'] for m in page_metrics if m['cached'])
+    dataset['evaluation_seconds'] = sum(m['evaluation_seconds'] for m in page_metrics)
+    return dataset
 
 def main():
+    parser = argparse.ArgumentParser(description='Avalia o pipeline do TRUEslator sobre um conjunto de páginas')
+    parser.add_argument('--manifest', default=MANIFEST_PATH, help='arquivo JSON com as páginas a avaliar')
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1), help='processos em paralelo')
+    parser.add_argument('--no-cache', action='store_true', help='reprocessa todas as páginas')
+    parser.add_argument('--cleaning-tiers', action='store_true', help='compara SSIM e tempo de cada camada de limpeza')
+    parser.add_argument('--plot', action='store_true', help='regenera o gráfico de evolução mesmo que tenha sido gerado há pouco')
+    args = parser.parse_args()
+
+    run_start = time.perf_counter()
+    pages = load_manifest(args.manifest)
+    if not pages:
+        parser.error(f'o manifesto {args.manifest} não tem páginas')
+    config_hash = compute_config_hash(MODEL_PATH)
+
+    # Executar o pipeline apenas nas páginas sem cache
+    outputs, cache_paths = run_pipeline(pages, config_hash, args.workers, not args.no_cache)
+
     # Inicializar o avaliador de métricas
     evaluator = TRUEslatorMetrics()
-    
-    # Carregar dados usando o pipeline real
-    data = load_example_data()
-    
-    # Salvar textos para análise manual
-    os.makedirs('metrics/comparison', exist_ok=True)
-    
-    # Salvar texto extraído pelo OCR
-    with open('metrics/comparison/extracted_text.txt', 'w', encoding='utf-8') as f:
-        f.write(data['extracted_text'])
-    
-    # Salvar texto traduzido
-    with open('metrics/comparison/translated_text.txt', 'w', encoding='utf-8') as f:
-        f.write(data['translated_text'])
-    
-    # Salvar texto de referência
-    with open('metrics/comparison/reference_text.txt', 'w', encoding='utf-8') as f:
-        f.write(data['reference_text'])
-    
-    # Avaliar e salvar métricas
-    metrics = evaluator.evaluate_and_save(
-        original_text=data['original_text'],
-        translated_text=data['translated_text'],
-        reference_text=data['reference_text'],
-        original_img=data['original_img'],
-        inpainted_img=data['inpainted_img'],
-        predicted_boxes=data['predicted_boxes'],
-        ground_truth_boxes=data['ground_truth_boxes']
-    )
-    
+
+    # Qualidade da tradução por balão, com todas as páginas codificadas em lote
+    bubble_scores = evaluator.calculate_bubble_translation_quality([
+        (outputs[page['id']]['translated_texts'], _read_bubbles(page['reference_text']))
+        for page in pages
+    ])
+
+    page_metrics = [
+        evaluate_page(evaluator, page, outputs[page['id']], cache_paths[page['id']], bubble_score, args.cleaning_tiers)
+        for page, bubble_score in zip(pages, bubble_scores)
+    ]
+
+    # Métricas de detecção por caixa nas páginas com rótulos YOLO
+    page_detections, dataset_detection = evaluate_page_detections(pages, outputs)
+    for m in page_metrics:
+        if m['page_id'] in page_detections:
+            m['detection'] = page_detections[m['page_id']]
+
+    record = aggregate_metrics(page_metrics)
+    if dataset_detection is not None:
+        record['detection'] = dataset_detection
+    record['config_hash'] = config_hash
+    record['wall_seconds'] = time.perf_counter() - run_start
+    record['pages'] = page_metrics
+    metrics = evaluator.save_metrics(record, force_plot=args.plot)
+
     # Exibir resultados
-    print('\nResultados da Avaliação:')
+    print('\nResultados por página:')
+    for m in page_metrics:
+        origin = 'cache' if m['cached'] else f"{m['pipeline_seconds']:.1f}s"
+        if m['degraded']:
+            origin += ', degradada'
+        print(f"- {m['page_id']}: geral {m['overall_score']:.4f}, tradução {m['translation_quality']:.4f}, "
+              f"tradução por balão {m['bubble_translation_quality']:.4f}, "
+              f"inpainting {m['inpainting_quality']:.4f}, detecção {m['text_detection_rate']:.4f} ({origin})")
+        for tier, result in m.get('cleaning_tiers', {}).items():
+            print(f"    {tier}: SSIM {result['ssim']:.4f}, {result['time_ms']:.1f} ms ({result['time_per_bubble_ms']:.1f} ms/balão)")
+
+    print(f"\nResultados do conjunto ({metrics['num_pages']} páginas, {metrics['cached_pages']} em cache, "
+          f"{metrics['degraded_pages']} degradadas):")
     print(f"Qualidade da tradução: {metrics['translation_quality']:.4f}")
+    print(f"Qualidade da tradução por balão: {metrics['bubble_translation_quality']:.4f}")
     print(f"Qualidade do Inpainting: {metrics['inpainting_quality']:.4f}")
     print(f"Taxa de Detecção: {metrics['text_detection_rate']:.4f}")
     print(f"Pontuação Geral: {metrics['overall_score']:.4f}")
-    print(f"\nGráfico salvo em: {evaluator.plot_file}")
-    print(f"\nTextos salvos para análise manual em metrics/comparison/")
-    print("- Texto extraído: extracted_text.txt")
-    print("- Texto traduzido: translated_text.txt")
-    print("- Texto de referência: reference_text.txt")
+    if 'detection' in metrics:
+        detection = metrics['detection']
+        print(f"Detecção: precisão {detection['precision']:.4f}, revocação {detection['recall']:.4f}, "
+              f"F1 {detection['f1']:.4f}, mAP@.5 {detection['map50']:.4f}, mAP@[.5:.95] {detection['map50_95']:.4f}")
+    print(f"Tempo do pipeline: {metrics['pipeline_seconds']:.1f}s "
+          f"(cache poupou {metrics['cached_pipeline_seconds']:.1f}s), tempo total: {metrics['wall_seconds']:.1f}s")
+    print(f"\nExecução {metrics['run_id']} salva em: {evaluator.metrics_db}")
+    if evaluator.plot_updated:
+        print(f"Gráfico salvo em: {evaluator.plot_file}")
+    else:
+        print(f"Gráfico não atualizado (gerado há menos de {PLOT_MIN_INTERVAL // 60} minutos; use --plot para forçar)")
+    print(f"\nTextos salvos para análise manual em {COMPARISON_DIR}/<página>/")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -7,6 +7,7 @@ const inputImage = document.getElementById("inputImage");
 const outputImage = document.getElementById("outputImage");
 const downloadButton = document.getElementById("downloadButton");
 const downloadLink = document.getElementById("downloadLink");
+const overlay = document.getElementById("overlay");
 
 downloadButton.style.display = "none";
 
@@ -19,6 +20,7 @@ fileInput.addEventListener("change", () => {
 	// Clear the previous images
 	inputImage.src = "";
 	outputImage.src = "";
+	clearOverlay();
 
 	const file = fileInput.files[0];
 	const reader = new FileReader();
@@ -32,6 +34,118 @@ fileInput.addEventListener("change", () => {
 	reader.readAsDataURL(file);
 });
 
+function clearOverlay() {
+	overlay.innerHTML = "";
+}
+
+function resetForm() {
+	fileInput.value = "";
+	inputImage.style.display = "none";
+	outputImage.style.display = "none";
+	spinner.style.display = "none";
+	downloadButton.style.display = "none";
+	translateButton.style.display = "block";
+	clearOverlay();
+}
+
+// Place one overlay per detected bubble, positioned in percent of the page
+// so it follows the input image when it is scaled
+function showBoxes(data) {
+	clearOverlay();
+
+	data.bounding_boxes.forEach(([x1, y1, x2, y2], index) => {
+		const bubble = document.createElement("div");
+		bubble.className = "bubble-overlay";
+		bubble.dataset.index = index;
+		bubble.style.left = `${(x1 / data.width) * 100}%`;
+		bubble.style.top = `${(y1 / data.height) * 100}%`;
+		bubble.style.width = `${((x2 - x1) / data.width) * 100}%`;
+		bubble.style.height = `${((y2 - y1) / data.height) * 100}%`;
+		overlay.appendChild(bubble);
+	});
+}
+
+function updateBubble(index, text, translated) {
+	const bubble = overlay.querySelector(`[data-index="${index}"]`);
+	if (!bubble) {
+		return;
+	}
+
+	bubble.textContent = text || "";
+	bubble.classList.toggle("translated", translated);
+}
+
+function showResult(result) {
+	outputImage.src = `data:image/png;base64,${result.image}`;
+	outputImage.style.display = "block";
+
+	// Generate timestamp for the download link
+	const timestamp = new Date().toISOString().replace(/[^\w\s]/gi, "-");
+	downloadLink.href = outputImage.src;
+	downloadLink.download = `MangaTranslator-${timestamp}.png`;
+
+	downloadButton.style.display = "block";
+
+	translateButton.style.display = "inline-block";
+	spinner.style.display = "none";
+}
+
+function handleEvent(event, data) {
+	switch (event) {
+		case "boxes":
+			showBoxes(data);
+			break;
+		case "text":
+			updateBubble(data.index, data.text, false);
+			break;
+		case "translation":
+			updateBubble(data.index, data.translated_text, true);
+			break;
+		case "image":
+			clearOverlay();
+			showResult(data);
+			return true;
+		case "error":
+			alert(data.message);
+			resetForm();
+			return true;
+	}
+	return false;
+}
+
+// Read the Server-Sent Events stream of /predict/stream and dispatch each event.
+// Returns whether the stream ended with an "image" or "error" event.
+async function readEvents(response) {
+	const reader = response.body.getReader();
+	const decoder = new TextDecoder();
+	let buffer = "";
+	let finished = false;
+
+	while (true) {
+		const { value, done } = await reader.read();
+		if (done) {
+			return finished;
+		}
+
+		buffer += decoder.decode(value, { stream: true });
+		const messages = buffer.split("\n\n");
+		buffer = messages.pop();
+
+		for (const message of messages) {
+			let event = "message";
+			let data = "";
+			for (const line of message.split("\n")) {
+				if (line.startsWith("event: ")) {
+					event = line.slice(7);
+				} else if (line.startsWith("data: ")) {
+					data += line.slice(6);
+				}
+			}
+			finished = handleEvent(event, JSON.parse(data)) || finished;
+		}
+	}
+}
+
 async function predict() {
 	if (fileInput.files.length === 0) {
 		alert("Please select an image file.");
@@ -44,7 +158,7 @@ async function predict() {
 	reader.onloadend = async function () {
 		const base64Image = reader.result.split(",")[1];
 
-		const response = await fetch("/predict", {
+		const response = await fetch("/predict/stream", {
 			method: "POST",
 			headers: {
 				"Content-Type": "application/json",
@@ -52,38 +166,30 @@ async function predict() {
 			body: JSON.stringify({ image: base64Image }),
 		});
 
-		const result = await response.json();
-		console.log(result);
-
 		if (response.status !== 200) {
-			alert(result.message);
-
-			// Reset the input
-			fileInput.value = "";
-			inputImage.style.display = "none";
-			outputImage.style.display = "none";
-			spinner.style.display = "none";
-			downloadButton.style.display = "none";
-			translateButton.style.display = "block";
+			alert("Internal Server Error");
+			resetForm();
 			return;
 		}
 
-		outputImage.src = `data:image/jpeg;base64,${result.image}`;
-		outputImage.style.display = "block";
-
-		// Generate timestamp for the download link
-		const timestamp = new Date().toISOString().replace(/[^\w\s]/gi, "-");
-		downloadLink.href = outputImage.src;
-		downloadLink.download = `MangaTranslator-${timestamp}.jpg`;
-
-		downloadButton.style.display = "block";
+		let finished = false;
+		try {
+			finished = await readEvents(response);
+		} catch (error) {
+			console.error(error);
+		}
 
-		translateButton.style.display = "inline-block";
-		spinner.style.display = "none";
+		// The connection closed before the page was finished
+		if (!finished) {
+			alert("The translation was interrupted. Please try again.");
+			resetForm();
+		}
 	};
 
 	reader.readAsDataURL(file);
 
+	clearOverlay();
+	outputImage.style.display = "none";
 	translateButton.style.display = "none";
 	spinner.style.display = "block";
 }
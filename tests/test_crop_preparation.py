@@ -0,0 +1,62 @@
+import numpy as np
+from PIL import Image
+
+from utils.crop_preparation import OcrInputSpec, prepare_crops
+
+SPEC = OcrInputSpec(height=32, width=32, rescale_factor=1 / 255, mean=0.5, std=0.5)
+
+
+def make_page():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, (120, 80, 3), dtype=np.uint8)
+
+
+def test_gray_crops_are_views_matching_pil():
+    page = make_page()
+    boxes = [[10, 20, 50, 60, 0.9, 0], [0, 0, 80, 10, 0.8, 0]]
+
+    prepared = prepare_crops(page, boxes, SPEC)
+
+    assert prepared.gray.size == 40 * 40 + 80 * 10
+    for index, (x1, y1, x2, y2) in enumerate(prepared.boxes):
+        crop = prepared.gray_crop(index)
+        assert np.shares_memory(crop, prepared.gray)
+        expected = np.asarray(Image.fromarray(page[y1:y2, x1:x2]).convert("L"), dtype=int)
+        assert np.abs(crop.astype(int) - expected).max() <= 1
+
+
+def test_pil_page_and_normalization():
+    page = Image.fromarray(make_page())
+    boxes = [[-5, 100, 90, 130, 0.9, 0]]
+
+    prepared = prepare_crops(page, boxes, SPEC)
+
+    assert prepared.boxes == [(0, 100, 80, 120)]
+    np.testing.assert_array_equal(prepared.color[0], np.asarray(page)[100:120, 0:80])
+    assert prepared.ocr_input.shape == (1, 32, 32)
+    assert prepared.ocr_input.dtype == np.float32
+    assert -1.0 <= prepared.ocr_input.min() and prepared.ocr_input.max() <= 1.0
+
+
+def test_spec_from_processor():
+    class Processor:
+        size = {"height": 224, "width": 224}
+        do_rescale = True
+        rescale_factor = 1 / 255
+        do_normalize = True
+        image_mean = [0.5, 0.5, 0.5]
+        image_std = [0.5, 0.5, 0.5]
+        resample = Image.BICUBIC
+
+    assert OcrInputSpec.from_processor(Processor) == OcrInputSpec(224, 224, 1 / 255, 0.5, 0.5, Image.BICUBIC)
+
+
+def test_ocr_input_matches_pil_preprocessing():
+    page = make_page()
+    boxes = [[0, 0, 80, 120, 0.9, 0]]
+
+    prepared = prepare_crops(page, boxes, SPEC)
+
+    # Manga-OCR converts to grayscale and the processor resizes with PIL bilinear
+    expected = np.asarray(Image.fromarray(page).convert("L").resize((32, 32), Image.BILINEAR), dtype=np.float32)
+    np.testing.assert_allclose(prepared.ocr_input[0], (expected / 255 - 0.5) / 0.5, atol=2 / 255 / 0.5)
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from metrics.detection_metrics import average_precision, box_iou, evaluate_detections, load_yolo_labels, match_detections
+
+
+def test_box_iou_known_values():
+    boxes_a = [[0, 0, 10, 10]]
+    boxes_b = [[0, 0, 10, 10], [5, 0, 15, 10], [20, 20, 30, 30]]
+
+    np.testing.assert_allclose(box_iou(boxes_a, boxes_b), [[1.0, 1 / 3, 0.0]])
+
+
+def test_match_detections_uses_each_ground_truth_once():
+    ground_truth = [[0, 0, 10, 10]]
+    predicted = [[0, 0, 10, 10], [0, 0, 10, 9]]
+
+    true_positives = match_detections(predicted, [0.5, 0.9], ground_truth, [0.5])
+
+    # The higher-scoring prediction takes the only ground truth box
+    assert true_positives.tolist() == [[False, True]]
+
+
+def test_false_positive_above_two_true_positives():
+    ground_truth = [[0, 0, 10, 10], [20, 0, 30, 10]]
+    predicted = [[50, 50, 60, 60], [0, 0, 10, 10], [20, 0, 30, 10]]
+    scores = [0.9, 0.8, 0.7]
+
+    true_positives = match_detections(predicted, scores, ground_truth, [0.5])
+    ap = average_precision(true_positives, np.asarray(scores), len(ground_truth))
+
+    assert ap[0] == pytest.approx(2 / 3, abs=1e-3)
+
+    metrics = evaluate_detections([(predicted, scores, ground_truth)])
+    assert metrics["precision"] == pytest.approx(2 / 3)
+    assert metrics["recall"] == 1.0
+    assert metrics["f1"] == pytest.approx(0.8)
+
+
+def test_load_yolo_labels(tmp_path):
+    labels = tmp_path / "page.txt"
+    labels.write_text("0 0.5 0.25 0.2 0.1\n")
+
+    np.testing.assert_allclose(load_yolo_labels(str(labels), (100, 200)), [[40, 40, 60, 60]])
+
+
+def test_load_yolo_labels_empty_file(tmp_path):
+    labels = tmp_path / "page.txt"
+    labels.write_text("")
+
+    assert load_yolo_labels(str(labels), (100, 200)).shape == (0, 4)
+
+
+def test_load_yolo_labels_missing_file(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        load_yolo_labels(str(tmp_path / "missing.txt"), (100, 200))
@@ -0,0 +1,26 @@
+from utils.predict_bounding_boxes import _non_max_suppression
+
+
+def test_contained_fragment_keeps_whole_bubble():
+	boxes = [[0, 0, 100, 200, 0.6, 0], [0, 150, 100, 200, 0.9, 0]]
+
+	assert _non_max_suppression(boxes) == [[0, 0, 100, 200, 0.9, 0]]
+
+
+def test_seam_fragments_merge_into_union():
+	# A 400px bubble cut by the seam of two tiles overlapping between y=225 and y=300
+	boxes = [[10, 0, 110, 300, 0.9, 0], [12, 225, 108, 400, 0.8, 0]]
+
+	assert _non_max_suppression(boxes, [True, True]) == [[10, 0, 110, 400, 0.9, 0]]
+
+
+def test_uncut_neighbours_are_kept_apart():
+	boxes = [[10, 0, 110, 300, 0.9, 0], [12, 250, 108, 400, 0.8, 0]]
+
+	assert len(_non_max_suppression(boxes, [False, False])) == 2
+
+
+def test_duplicates_are_suppressed_per_class():
+	boxes = [[0, 0, 100, 100, 0.9, 0], [5, 5, 105, 105, 0.8, 0], [5, 5, 105, 105, 0.7, 1]]
+
+	assert _non_max_suppression(boxes) == [[0, 0, 100, 100, 0.9, 0], [5, 5, 105, 105, 0.7, 1]]
@@ -0,0 +1,84 @@
+import pytest
+
+from utils import translator_client
+from utils.translator_client import CircuitBreaker, TokenBucket, TransientTranslatorError, TranslatorClient, TranslatorUnavailableError
+
+
+def failing():
+    raise TransientTranslatorError("HTTP 503")
+
+
+def test_retried_call_counts_as_one_breaker_failure(monkeypatch):
+    monkeypatch.setattr(translator_client.time, "sleep", lambda _: None)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        failing()
+
+    client = TranslatorClient("test", breaker=CircuitBreaker(failure_threshold=2), max_retries=3)
+
+    with pytest.raises(TransientTranslatorError):
+        client.call(flaky)
+    assert len(attempts) == 4
+    assert client.breaker.allow()
+
+    with pytest.raises(TransientTranslatorError):
+        client.call(flaky)
+    assert len(attempts) == 8
+
+    with pytest.raises(TranslatorUnavailableError):
+        client.call(flaky)
+    assert len(attempts) == 8
+
+
+def test_retry_recovers_and_resets_breaker(monkeypatch):
+    monkeypatch.setattr(translator_client.time, "sleep", lambda _: None)
+    responses = iter([TransientTranslatorError("HTTP 429"), "ok"])
+
+    def call():
+        response = next(responses)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    client = TranslatorClient("test", breaker=CircuitBreaker(failure_threshold=1))
+
+    assert client.call(call) == "ok"
+    assert client.breaker.allow()
+
+
+def test_open_circuit_does_not_spend_tokens():
+    limiter = TokenBucket(rate=1, capacity=1)
+    breaker = CircuitBreaker(failure_threshold=1)
+    breaker.record_failure()
+    client = TranslatorClient("test", limiter=limiter, breaker=breaker)
+
+    with pytest.raises(TranslatorUnavailableError, match="circuit open"):
+        client.call(lambda: "ok")
+    assert limiter.acquire(1, timeout=0)
+
+
+def test_rate_limit_refusal_releases_breaker_trial():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    limiter = TokenBucket(rate=1e-6, capacity=1)
+    limiter.acquire(1)
+    # The bucket refills far slower than the wait timeout, so acquire refuses at once
+    client = TranslatorClient("test", limiter=limiter, breaker=breaker)
+
+    with pytest.raises(TranslatorUnavailableError, match="rate limit"):
+        client.call(lambda: "ok", cost=1)
+    assert breaker.allow()
+
+
+def test_long_retry_after_fails_over_without_sleeping(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(translator_client.time, "sleep", sleeps.append)
+
+    def throttled():
+        raise TransientTranslatorError("HTTP 429", retry_after=60)
+
+    with pytest.raises(TransientTranslatorError):
+        TranslatorClient("test").call(throttled)
+    assert sleeps == []
@@ -0,0 +1,121 @@
+"""
+This module prepares the detected bubbles of a page in a single pass: the color
+and grayscale crops used for cleaning and the normalized input tensor for Manga-OCR.
+"""
+from itertools import accumulate
+from typing import List, NamedTuple, Tuple, Union
+import cv2
+import numpy as np
+from PIL import Image
+
+
+class OcrInputSpec(NamedTuple):
+    """
+    Input layout expected by the OCR model: size, resampling filter, rescale factor and normalization.
+    `resample` is a PIL filter, since the processor resizes with PIL.
+    """
+    height: int
+    width: int
+    rescale_factor: float
+    mean: float
+    std: float
+    resample: int = Image.BILINEAR
+
+    @classmethod
+    def from_processor(cls, processor) -> "OcrInputSpec":
+        """
+        Read the layout from a transformers image processor, such as Manga-OCR's ViTImageProcessor.
+        The crops are grayscale and repeated to every channel, so the channels must share their statistics.
+        """
+        mean = np.unique(processor.image_mean) if processor.do_normalize else np.array([0.0])
+        std = np.unique(processor.image_std) if processor.do_normalize else np.array([1.0])
+        if mean.size != 1 or std.size != 1:
+            raise ValueError("OCR processor normalizes each channel differently, grayscale crops cannot be shared")
+
+        size = processor.size
+        return cls(
+            height=size["height"],
+            width=size["width"],
+            rescale_factor=processor.rescale_factor if processor.do_rescale else 1.0,
+            mean=float(mean[0]),
+            std=float(std[0]),
+            resample=int(getattr(processor, "resample", Image.BILINEAR)),
+        )
+
+
+class PreparedCrops(NamedTuple):
+    """
+    Buffers shared by every bubble of a page.
+    `color` holds the RGB crop of each box, `gray` holds the grayscale crops of all
+    boxes back to back, starting at `offsets`, and `ocr_input` holds one (H, W) OCR image per box.
+    """
+    boxes: List[Tuple[int, int, int, int]]
+    color: List[np.ndarray]
+    offsets: List[int]
+    gray: np.ndarray
+    ocr_input: np.ndarray
+
+    def gray_crop(self, index: int) -> np.ndarray:
+        """
+        Return a view of the grayscale buffer for the given box, without copying.
+        """
+        x1, y1, x2, y2 = self.boxes[index]
+        start = self.offsets[index]
+        return self.gray[start:start + (x2 - x1) * (y2 - y1)].reshape(y2 - y1, x2 - x1)
+
+
+def _crop_color(page: Union[Image.Image, np.ndarray], box: Tuple[int, int, int, int]) -> np.ndarray:
+    """
+    Return the RGB crop of one box. For a PIL page this is the only copy of the region;
+    for an array page it is a view into the page.
+    """
+    x1, y1, x2, y2 = box
+    if isinstance(page, Image.Image):
+        crop = page.crop(box)
+        return np.array(crop if crop.mode == "RGB" else crop.convert("RGB"))
+    if page.ndim == 2:
+        return np.repeat(page[y1:y2, x1:x2, None], 3, axis=2)
+    return page[y1:y2, x1:x2, :3]
+
+
+def _clip_box(box, width: int, height: int) -> Tuple[int, int, int, int]:
+    """
+    Round a box to integers inside the page, keeping at least one pixel on each side.
+    """
+    x1, y1, x2, y2 = (int(v) for v in box[:4])
+    x1 = min(max(x1, 0), width - 1)
+    y1 = min(max(y1, 0), height - 1)
+    return x1, y1, min(max(x2, x1 + 1), width), min(max(y2, y1 + 1), height)
+
+
+def prepare_crops(page: Union[Image.Image, np.ndarray], boxes: List, spec: OcrInputSpec) -> PreparedCrops:
+    """
+    Build the color crop, the grayscale crop and the OCR input of every box in one pass.
+    Each region is cropped once; the grayscale version is written straight into a buffer
+    that only covers the boxes, never the whole page, and gray_crop returns views into it.
+    """
+    width, height = page.size if isinstance(page, Image.Image) else (page.shape[1], page.shape[0])
+    clipped = [_clip_box(box, width, height) for box in boxes]
+
+    areas = [(x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in clipped]
+    offsets = list(accumulate(areas, initial=0))[:-1]
+    ocr_input = np.empty((len(clipped), spec.height, spec.width), dtype=np.float32)
+    prepared = PreparedCrops(clipped, [], offsets, np.empty(sum(areas), dtype=np.uint8), ocr_input)
+
+    resized = np.empty((len(clipped), spec.height, spec.width), dtype=np.uint8)
+    for i, box in enumerate(clipped):
+        color = _crop_color(page, box)
+        prepared.color.append(color)
+
+        # Same luma weights as PIL's "L" mode used by Manga-OCR
+        crop = prepared.gray_crop(i)
+        cv2.cvtColor(color, cv2.COLOR_RGB2GRAY, dst=crop)
+
+        # Resized with PIL and the processor's filter, like Manga-OCR's own preprocessing
+        resized[i] = np.asarray(Image.fromarray(crop).resize((spec.width, spec.height), spec.resample))
+
+    # (x * rescale_factor - mean) / std, computed in place in a single float buffer
+    np.multiply(resized, spec.rescale_factor / spec.std, out=ocr_input)
+    ocr_input -= spec.mean / spec.std
+
+    return prepared
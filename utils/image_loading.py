@@ -0,0 +1,89 @@
+"""
+This module decodes uploaded images with bounded memory and builds the
+downscaled proxy used for detection.
+"""
+import io
+import base64
+import math
+from typing import List, Tuple
+from PIL import Image
+
+# Uploads above this size are rejected before any pixel data is decoded
+MAX_IMAGE_PIXELS = 120_000_000
+# Uploads above this size are decoded at a reduced resolution
+MAX_DECODE_PIXELS = 24_000_000
+# Detection runs on a proxy whose shorter side is at most this many pixels
+DETECTION_MAX_SHORT_SIDE = 1280
+
+
+class ImageTooLargeError(ValueError):
+    """Raised when an uploaded image exceeds MAX_IMAGE_PIXELS."""
+
+
+def decode_base64_image(encoded_image: str, max_pixels: int = MAX_DECODE_PIXELS) -> Image.Image:
+    """
+    Decode a base64 image to RGB, refusing oversized uploads and decoding
+    large ones at reduced resolution (DCT scaling via Image.draft for JPEG).
+    """
+    decoded_bytes = base64.b64decode(encoded_image)
+    try:
+        image = Image.open(io.BytesIO(decoded_bytes))
+    except Image.DecompressionBombError as e:
+        raise ImageTooLargeError(str(e)) from e
+
+    width, height = image.size
+    if width * height > MAX_IMAGE_PIXELS:
+        raise ImageTooLargeError(f"Image has {width}x{height} pixels, limit is {MAX_IMAGE_PIXELS}")
+
+    target = None
+    if width * height > max_pixels:
+        factor = math.sqrt(width * height / max_pixels)
+        target = (int(width / factor), int(height / factor))
+        if image.format == "JPEG":
+            # Decodes directly at 1/2, 1/4 or 1/8 scale, never below the target size
+            image.draft("RGB", target)
+
+    # convert() copies even when the mode already matches, so only call it when needed
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    else:
+        image.load()
+
+    if target is not None and image.width * image.height > max_pixels:
+        image = image.resize(target, Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+    return image
+
+
+def build_detection_proxy(image: Image.Image, max_short_side: int = DETECTION_MAX_SHORT_SIDE) -> Tuple[Image.Image, float]:
+    """
+    Return a downscaled copy of the image for detection and the scale applied to it.
+    The shorter side is bounded so tall long-strip pages keep a usable width.
+    """
+    scale = min(1.0, max_short_side / min(image.size))
+    if scale == 1.0:
+        return image, 1.0
+
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    return image.resize(size, Image.Resampling.BILINEAR, reducing_gap=2.0), scale
+
+
+def scale_boxes(boxes: List, scale: float, image_size: Tuple[int, int]) -> List:
+    """
+    Map [x1, y1, x2, y2, conf, cls] boxes found on a proxy back to the full-resolution image.
+    """
+    if scale == 1.0:
+        return boxes
+
+    width, height = image_size
+    scaled = []
+    for x1, y1, x2, y2, conf, cls in boxes:
+        scaled.append([
+            min(max(x1 / scale, 0), width),
+            min(max(y1 / scale, 0), height),
+            min(max(x2 / scale, 0), width),
+            min(max(y2 / scale, 0), height),
+            conf,
+            cls,
+        ])
+    return scaled
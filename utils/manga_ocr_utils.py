@@ -2,9 +2,19 @@
 This module is used to extract text from images using manga_ocr.
 """
 
+from typing import List, Optional
+import numpy as np
+import torch
 from manga_ocr import MangaOcr
+from manga_ocr.ocr import post_process
+from .crop_preparation import OcrInputSpec
+
+OCR_BATCH_SIZE = 16
+OCR_MAX_LENGTH = 300
 
 mocr = MangaOcr()
+# Input layout read from the loaded model's processor, used by utils.crop_preparation
+OCR_INPUT_SPEC = OcrInputSpec.from_processor(mocr.processor)
 
 def get_text_from_image(image):
 	"""
@@ -17,3 +27,20 @@ def get_text_from_image(image):
 	except Exception as e:
 		print(f"An error occurred: {str(e)}")
 		return None
+
+
+def get_text_from_tensors(pixel_values: np.ndarray) -> List[Optional[str]]:
+	"""
+	Extract text from a batch of crops already prepared for manga_ocr
+	(see utils.crop_preparation), skipping its per-image preprocessing.
+	"""
+
+	try:
+		# The grayscale crops are repeated to the 3 channels the model expects without copying
+		x = torch.from_numpy(pixel_values)[:, None].expand(-1, 3, -1, -1).to(mocr.model.device)
+		with torch.inference_mode():
+			ids = mocr.model.generate(x, max_length=OCR_MAX_LENGTH).cpu()
+		return [post_process(mocr.tokenizer.decode(row, skip_special_tokens=True)) for row in ids]
+	except Exception as e:
+		print(f"An error occurred: {str(e)}")
+		return [None] * len(pixel_values)
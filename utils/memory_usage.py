@@ -0,0 +1,74 @@
+"""
+This module measures the peak resident memory of the process while a block runs.
+"""
+import sys
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Blocks currently being tracked; the high-water mark is only reset when none is running
+_active_blocks = 0
+_active_lock = threading.Lock()
+
+
+def _reset_peak_rss() -> bool:
+    """
+    Reset the kernel's high-water mark (VmHWM). Only supported on Linux.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _read_peak_rss_mb() -> Optional[float]:
+    """
+    Read the peak resident set size of the process in MB.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+@contextmanager
+def track_peak_memory() -> Iterator[Dict[str, Optional[float]]]:
+    """
+    Track the peak memory of the process while the block runs. The yielded dict is
+    filled with `process_peak_memory_mb` when the block exits.
+
+    This is a process-wide number, not a per-request one: it includes the memory of
+    every request running at the same time. The high-water mark is only reset when
+    no other tracked block is running, so a request never wipes the peak of another.
+    Where the high-water mark cannot be reset it is the peak since process start.
+    """
+    global _active_blocks
+    stats: Dict[str, Optional[float]] = {}
+    with _active_lock:
+        if _active_blocks == 0:
+            _reset_peak_rss()
+        _active_blocks += 1
+    try:
+        yield stats
+    finally:
+        with _active_lock:
+            _active_blocks -= 1
+        peak = _read_peak_rss_mb()
+        stats["process_peak_memory_mb"] = round(peak, 1) if peak is not None else None
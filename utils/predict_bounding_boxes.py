@@ -4,17 +4,63 @@ in images using the trained Object Detection model.
 """
 import uuid
 import os
-from typing import List
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+import numpy as np
 from PIL import Image
 from ultralytics import YOLO
 
-def predict_bounding_boxes(model: YOLO, image_path: str) -> List:
+# Pages taller than this height/width ratio (long-strip webtoons) are split into tiles
+TILE_ASPECT_RATIO = 2.5
+# Fraction of each tile shared with the next one, so bubbles on a seam appear whole in at least one tile
+TILE_OVERLAP = 0.25
+TILE_BATCH_SIZE = 4
+NMS_IOU_THRESHOLD = 0.5
+# Boxes mostly contained in another one are parts of the same bubble, which keeps the larger box
+NMS_CONTAINMENT_THRESHOLD = 0.8
+# Boxes closer than this to a tile edge that is not a page edge were cut by the seam
+TILE_EDGE_MARGIN = 4
+# Seam fragments are merged when they share this fraction of the narrower box's width
+SEAM_WIDTH_OVERLAP = 0.5
+
+
+def predict_bounding_boxes(
+	model: YOLO,
+	image: Union[str, Image.Image],
+	tiled: Optional[bool] = None,
+	save_crops: bool = False,
+) -> List:
 	"""
 	Predict bounding boxes for text in images using the trained Object Detection model.
+	Accepts an image path or an already decoded image.
+	Tall pages are detected tile by tile unless `tiled` is given explicitly.
+	With `save_crops`, each detected region is saved to ./bounding_box_images for debugging;
+	the directory is shared, so this is only meant for a single process.
 	"""
 
-	image = Image.open(image_path)
-	bounding_box_images_path = "./bounding_box_images"
+	if isinstance(image, str):
+		image = Image.open(image)
+
+	if tiled is None:
+		width, height = image.size
+		tiled = height > width * TILE_ASPECT_RATIO
+
+	# Perform inference
+	if tiled:
+		boxes = predict_bounding_boxes_tiled(model, image)
+	else:
+		boxes = model.predict(image)[0].boxes.data.tolist()
+
+	if save_crops:
+		_save_crops(image, boxes)
+
+	return boxes
+
+
+def _save_crops(image: Image.Image, boxes: List, bounding_box_images_path: str = "./bounding_box_images") -> None:
+	"""
+	Replace the contents of the debug directory with one crop per detected box.
+	"""
 
 	# Create the directory if it doesn't exist
 	if not os.path.exists(bounding_box_images_path):
@@ -24,16 +70,154 @@ def predict_bounding_boxes(model: YOLO, image_path: str) -> List:
 	for file in os.listdir(bounding_box_images_path):
 		os.remove(os.path.join(bounding_box_images_path, file))
 
-	# Perform inference
-	result = model.predict(image_path)[0]
-
-	for box in result.boxes:
-		label = result.names[box.cls[0].item()]
-		coords = [round(x) for x in box.xyxy[0].tolist()]
-		prob = round(box.conf[0].item(), 4)
+	for box in boxes:
+		coords = [round(x) for x in box[:4]]
 		cropped_image = image.crop(coords)
 
 		# save each image under a unique name
 		cropped_image.save(f"{bounding_box_images_path}/{uuid.uuid4()}.png")
 
-	return result.boxes.data.tolist()
+
+def predict_bounding_boxes_tiled(
+	model: YOLO,
+	image: Image.Image,
+	tile_height: Optional[int] = None,
+	overlap: float = TILE_OVERLAP,
+	batch_size: int = TILE_BATCH_SIZE,
+) -> List:
+	"""
+	Predict bounding boxes on a tall page by running the model over overlapping
+	horizontal tiles in batches and merging the boxes found across tile seams.
+	Tiles are cropped lazily, so only one batch of tiles is held in memory at a time.
+	"""
+
+	if image.mode != "RGB":
+		image = image.convert("RGB")
+
+	tile_height = tile_height or image.size[0]
+	page_height = image.size[1]
+	boxes = []
+	truncated = []
+
+	for batch in _batched(_iter_tiles(image, tile_height, overlap), batch_size):
+		offsets = [top for top, _ in batch]
+		tiles = [tile for _, tile in batch]
+
+		for top, tile, result in zip(offsets, tiles, model.predict(tiles, stream=True, verbose=False)):
+			bottom = top + tile.size[1]
+			for x1, y1, x2, y2, conf, cls in result.boxes.data.tolist():
+				boxes.append([x1, y1 + top, x2, y2 + top, conf, cls])
+				truncated.append(
+					(top > 0 and y1 <= TILE_EDGE_MARGIN)
+					or (bottom < page_height and y2 + top >= bottom - TILE_EDGE_MARGIN)
+				)
+
+	return _non_max_suppression(boxes, truncated)
+
+
+def _iter_tiles(image: Image.Image, tile_height: int, overlap: float) -> Iterator[Tuple[int, Image.Image]]:
+	"""
+	Yield (top offset, tile) pairs covering the full height of the image.
+	The last tile is aligned with the bottom edge so no tile is padded.
+	"""
+
+	width, height = image.size
+	if height <= tile_height:
+		yield 0, image
+		return
+
+	stride = max(1, int(tile_height * (1 - overlap)))
+	tops = list(range(0, height - tile_height, stride)) + [height - tile_height]
+
+	for top in tops:
+		yield top, image.crop((0, top, width, top + tile_height))
+
+
+def _batched(iterable: Iterable, size: int) -> Iterator[list]:
+	"""
+	Group an iterable into lists of at most `size` elements.
+	"""
+
+	iterator = iter(iterable)
+	while batch := list(islice(iterator, size)):
+		yield batch
+
+
+def _non_max_suppression(
+	boxes: List,
+	truncated: Optional[List[bool]] = None,
+	iou_threshold: float = NMS_IOU_THRESHOLD,
+	containment_threshold: float = NMS_CONTAINMENT_THRESHOLD,
+	seam_width_overlap: float = SEAM_WIDTH_OVERLAP,
+) -> List:
+	"""
+	Class-aware non-maximum suppression over [x1, y1, x2, y2, conf, cls] boxes.
+	A box overlapping a higher-scoring box of the same class above `iou_threshold` is dropped.
+	When a box lies mostly inside another one, the larger box is kept. Boxes cut by a
+	tile seam (`truncated`) that overlap are merged into their union, so the whole bubble is kept.
+	"""
+
+	if not boxes:
+		return []
+
+	data = np.asarray(boxes, dtype=np.float64)
+	cut = np.zeros(len(data), dtype=bool) if truncated is None else np.asarray(truncated, dtype=bool)
+	order = np.argsort(-data[:, 4], kind="stable")
+	data = data[order]
+	cut = cut[order]
+
+	x1, y1, x2, y2, _, cls = data.T
+	areas = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+	suppressed = np.zeros(len(data), dtype=bool)
+	kept = []
+
+	for i in range(len(data)):
+		if suppressed[i]:
+			continue
+		suppressed[i] = True
+		box = data[i, :4].copy()
+		box_cut = cut[i]
+
+		# Merging grows the box, which can bring more fragments into reach
+		while True:
+			rest = np.flatnonzero(~suppressed & (cls == cls[i]))
+			if rest.size == 0:
+				break
+
+			inter_w = np.clip(np.minimum(box[2], x2[rest]) - np.maximum(box[0], x1[rest]), 0, None)
+			inter_h = np.clip(np.minimum(box[3], y2[rest]) - np.maximum(box[1], y1[rest]), 0, None)
+			inter = inter_w * inter_h
+			area = (box[2] - box[0]) * (box[3] - box[1])
+
+			iou = inter / np.maximum(area + areas[rest] - inter, 1e-9)
+			containment = inter / np.maximum(np.minimum(area, areas[rest]), 1e-9)
+			width_overlap = inter_w / np.maximum(np.minimum(box[2] - box[0], x2[rest] - x1[rest]), 1e-9)
+			seam = (box_cut | cut[rest]) & (inter_h > 0) & (width_overlap > seam_width_overlap)
+
+			contained = rest[containment > containment_threshold]
+			fragments = rest[seam & (containment <= containment_threshold)]
+			suppressed[rest[iou > iou_threshold]] = True
+			suppressed[contained] = True
+			suppressed[fragments] = True
+			grown = False
+
+			# A fragment that outscored the whole bubble is replaced by the bubble
+			if contained.size:
+				largest = contained[np.argmax(areas[contained])]
+				if areas[largest] > area:
+					box = data[largest, :4].copy()
+					box_cut = cut[largest]
+					grown = True
+
+			if fragments.size:
+				box[:2] = np.minimum(box[:2], data[fragments, :2].min(axis=0))
+				box[2:] = np.maximum(box[2:], data[fragments, 2:4].max(axis=0))
+				box_cut = box_cut and cut[fragments].all()
+				grown = True
+
+			if not grown:
+				break
+
+		kept.append(box.tolist() + [float(data[i, 4]), float(cls[i])])
+
+	return kept
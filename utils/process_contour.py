@@ -1,45 +1,63 @@
 """
 This module contains the function to process the contour in the image.
 """
-from typing import Tuple
+from typing import Optional, Tuple
 import cv2
 import numpy as np
 
 
-def process_contour(image: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+EMPTY_CONTOUR = np.array([[[0, 0]], [[0, 0]], [[0, 0]], [[0, 0]]])
+
+
+def to_grayscale(image: np.ndarray) -> np.ndarray:
+    """
+    Return the grayscale version of the image, or the image itself if it is already grayscale.
+    """
+    if len(image.shape) == 2:
+        return image
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
+def find_bubble_contour(gray: np.ndarray) -> Optional[np.ndarray]:
+    """
+    Find the largest valid contour in a grayscale crop using adaptive thresholding.
+    Returns None if no contour is large enough to be a bubble.
+    """
+    # Apply adaptive thresholding for better text/background separation
+    thresh = cv2.adaptiveThreshold(
+        gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
+        cv2.THRESH_BINARY, 11, 2
+    )
+
+    # Find contours with different parameters for better accuracy
+    contours, _ = cv2.findContours(
+        thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
+    )
+
+    # Filter out noise and get valid contours
+    valid_contours = [cnt for cnt in contours if cv2.contourArea(cnt) > 100]
+    if not valid_contours:
+        return None
+
+    # Get the largest valid contour
+    return max(valid_contours, key=cv2.contourArea)
+
+
+def process_contour(image: np.ndarray, gray: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
     """
     Process the contour in the image using adaptive thresholding and robust contour detection.
+    A precomputed grayscale version of the image can be passed to skip the conversion.
     Returns the processed image and the largest valid contour found.
     """
     try:
         # Ensure image is in correct format
-        if len(image.shape) == 2:
-            gray = image
-        else:
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-
-        # Apply adaptive thresholding for better text/background separation
-        thresh = cv2.adaptiveThreshold(
-            gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-            cv2.THRESH_BINARY, 11, 2
-        )
-
-        # Find contours with different parameters for better accuracy
-        contours, _ = cv2.findContours(
-            thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
-        )
-
-        if not contours:
-            # If no contours found, return original image and empty contour
-            return image, np.array([[[0, 0]], [[0, 0]], [[0, 0]], [[0, 0]]])
-
-        # Filter out noise and get valid contours
-        valid_contours = [cnt for cnt in contours if cv2.contourArea(cnt) > 100]
-        if not valid_contours:
-            return image, np.array([[[0, 0]], [[0, 0]], [[0, 0]], [[0, 0]]])
-
-        # Get the largest valid contour
-        largest_contour = max(valid_contours, key=cv2.contourArea)
+        if gray is None:
+            gray = to_grayscale(image)
+
+        largest_contour = find_bubble_contour(gray)
+        if largest_contour is None:
+            # If no contour found, return original image and empty contour
+            return image, EMPTY_CONTOUR
 
         # Create mask and apply morphological operations
         mask = np.zeros_like(gray)
@@ -58,4 +76,4 @@ def process_contour(image: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
 
     except Exception as e:
         print(f"Error in process_contour: {str(e)}")
-        return image, np.array([[[0, 0]], [[0, 0]], [[0, 0]], [[0, 0]]])
+        return image, EMPTY_CONTOUR
@@ -1,26 +1,81 @@
 """
 This module is used to translate manga from one language to another.
 """
-import os
-from deep_translator import GoogleTranslator, MicrosoftTranslator
+from typing import List, Optional, Tuple
 from dotenv import load_dotenv
 from .text_detection_utils import is_romanized_text
+from .translation_backends import get_backends
 
 
 load_dotenv()
 
 
+# Texts sent per backend call; a failed chunk only degrades its own bubbles
+TRANSLATE_CHUNK_SIZE = 25
+
+
+def translate_batch(texts: List[str], source_lang: str = "auto", target_lang: str = "pt") -> List[str]:
+    """
+    Translate a batch of texts with the first configured backend that succeeds.
+    Texts that are empty or already romanized are returned unchanged, and so are
+    texts no backend could translate, so a translator outage never fails the page.
+    """
+
+    return translate_batch_with_failures(texts, source_lang, target_lang)[0]
+
+
+def translate_batch_with_failures(
+    texts: List[str], source_lang: str = "auto", target_lang: str = "pt"
+) -> Tuple[List[str], List[int]]:
+    """
+    Same as translate_batch, also returning the indices of the texts that were left
+    untranslated because every backend failed, so callers can tell degraded output apart.
+    """
+
+    translated = list(texts)
+    failed = []
+    if source_lang == target_lang:
+        return translated, failed
+
+    pending = [i for i, text in enumerate(texts) if text and not is_romanized_text(text)]
+
+    for start in range(0, len(pending), TRANSLATE_CHUNK_SIZE):
+        chunk = pending[start:start + TRANSLATE_CHUNK_SIZE]
+        results = _translate_with_fallback([texts[i] for i in chunk], source_lang, target_lang)
+        if results is None:
+            print(f"No translator backend available, keeping {len(chunk)} texts untranslated")
+            failed.extend(chunk)
+            continue
+
+        for i, result in zip(chunk, results):
+            translated[i] = result
+
+    return translated, failed
+
+
+def _translate_with_fallback(texts: List[str], source_lang: str, target_lang: str) -> Optional[List[str]]:
+    """
+    Try each configured backend in order. Returns None if all of them failed.
+    """
+
+    for backend in get_backends():
+        if not backend.supports(source_lang, target_lang):
+            continue
+        try:
+            return backend.translate_batch(texts, source_lang, target_lang)
+        except Exception as e:
+            print(f"Translator backend {backend.name} failed: {str(e)}")
+
+    return None
+
+
 def translate_manga(text: str, source_lang: str = "auto", target_lang: str = "pt") -> str:
     """
     Translate manga from one language to another.
     """
 
-    if source_lang == target_lang or is_romanized_text(text):
-        return text
-
-    translated_text = MicrosoftTranslator(api_key=os.environ['MICROSOFT_API_KEY'],
-        target=target_lang, region='brazilsouth').translate(text)
+    translated_text = translate_batch([text], source_lang, target_lang)[0]
     print("Original text:", text)
     print("Translated text:", translated_text)
 
-    return translated_text
\ No newline at end of file
+    return translated_text
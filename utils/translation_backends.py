@@ -0,0 +1,231 @@
+"""
+This module contains the translator backends used by translate_manga.
+
+Backends are configured through the environment:
+- TRANSLATOR_BACKENDS: comma separated fallback order, e.g. "local,microsoft,google"
+- LOCAL_TRANSLATOR_MODELS: language pairs for the local backend, e.g.
+  "ja-en=Helsinki-NLP/opus-mt-ja-en". A value pointing to a CTranslate2 model
+  directory is run with CTranslate2, anything else with transformers.
+- MICROSOFT_API_KEY / MICROSOFT_REGION: credentials for the Microsoft backend
+- MICROSOFT_CHARS_PER_MINUTE: character quota the Microsoft rate limiter is sized to
+- GOOGLE_REQUESTS_PER_MINUTE: request rate the Google rate limiter is sized to
+"""
+import os
+import threading
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Dict, List, Tuple
+from .translator_client import TokenBucket, TransientTranslatorError, TranslatorClient
+
+DEFAULT_BACKENDS = "local,microsoft,google"
+DEFAULT_LOCAL_MODELS = "ja-en=Helsinki-NLP/opus-mt-ja-en"
+LOCAL_BATCH_SIZE = 16
+MICROSOFT_ENDPOINT = "https://api.cognitive.microsofttranslator.com/translate"
+MICROSOFT_CHARS_PER_MINUTE = 33300
+MICROSOFT_TIMEOUT = 10
+GOOGLE_ENDPOINT = "https://translate.googleapis.com/translate_a/single"
+GOOGLE_REQUESTS_PER_MINUTE = 60
+GOOGLE_TIMEOUT = 10
+# The OCR only reads Japanese, so "auto" resolves to it for backends without detection
+AUTO_SOURCE_LANG = "ja"
+
+
+class TranslatorBackend(ABC):
+    """
+    Base class for translator backends.
+    """
+    name = "base"
+
+    def supports(self, source_lang: str, target_lang: str) -> bool:
+        """
+        Return whether this backend can translate between the two languages.
+        """
+        return True
+
+    @abstractmethod
+    def translate_batch(self, texts: List[str], source_lang: str, target_lang: str) -> List[str]:
+        """
+        Translate a list of texts, returning the translations in the same order.
+        """
+
+
+class MicrosoftBackend(TranslatorBackend):
+    """
+    Remote backend calling the Microsoft Translator REST API through the shared
+    pooled session, rate limited to the character quota of the subscription.
+    """
+    name = "microsoft"
+
+    def __init__(self, api_key: str, region: str, chars_per_minute: float = MICROSOFT_CHARS_PER_MINUTE):
+        self.api_key = api_key
+        self.region = region
+        rate = chars_per_minute / 60
+        self.client = TranslatorClient(self.name, limiter=TokenBucket(rate=rate, capacity=rate * 10))
+
+    def supports(self, source_lang: str, target_lang: str) -> bool:
+        return bool(self.api_key)
+
+    def translate_batch(self, texts: List[str], source_lang: str, target_lang: str) -> List[str]:
+        params = {"api-version": "3.0", "to": target_lang}
+        if source_lang != "auto":
+            params["from"] = source_lang
+        headers = {
+            "Ocp-Apim-Subscription-Key": self.api_key,
+            "Ocp-Apim-Subscription-Region": self.region,
+        }
+        body = [{"Text": text} for text in texts]
+
+        def request() -> List[str]:
+            response = self.client.session.post(MICROSOFT_ENDPOINT, params=params, headers=headers,
+                json=body, timeout=MICROSOFT_TIMEOUT)
+            if response.status_code == 429 or response.status_code >= 500:
+                retry_after = response.headers.get("Retry-After")
+                raise TransientTranslatorError(f"HTTP {response.status_code}",
+                    retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None)
+            response.raise_for_status()
+            return [item["translations"][0]["text"] for item in response.json()]
+
+        return self.client.call(request, cost=sum(len(text) for text in texts))
+
+
+class GoogleBackend(TranslatorBackend):
+    """
+    Remote backend calling the public Google Translate endpoint through the shared
+    pooled session. The endpoint takes one text per request, so each text costs one token.
+    """
+    name = "google"
+
+    def __init__(self, requests_per_minute: float = GOOGLE_REQUESTS_PER_MINUTE):
+        rate = requests_per_minute / 60
+        self.client = TranslatorClient(self.name, limiter=TokenBucket(rate=rate, capacity=max(1.0, rate * 10)))
+
+    def translate_batch(self, texts: List[str], source_lang: str, target_lang: str) -> List[str]:
+        return [self._translate(text, source_lang, target_lang) for text in texts]
+
+    def _translate(self, text: str, source_lang: str, target_lang: str) -> str:
+        params = {"client": "gtx", "sl": source_lang, "tl": target_lang, "dt": "t", "q": text}
+
+        def request() -> str:
+            response = self.client.session.get(GOOGLE_ENDPOINT, params=params, timeout=GOOGLE_TIMEOUT)
+            if response.status_code == 429 or response.status_code >= 500:
+                raise TransientTranslatorError(f"HTTP {response.status_code}")
+            response.raise_for_status()
+            # The first element lists the translated segments of the text
+            return "".join(segment[0] for segment in response.json()[0] if segment[0])
+
+        return self.client.call(request)
+
+
+class LocalBackend(TranslatorBackend):
+    """
+    On-box backend running Marian-style models on the CPU, batched.
+    Models are loaded lazily the first time a language pair is used. A pair whose
+    model fails to load is marked unsupported instead of being reloaded on every call.
+    """
+    name = "local"
+
+    def __init__(self, models: Dict[Tuple[str, str], str], batch_size: int = LOCAL_BATCH_SIZE):
+        self.models = models
+        self.batch_size = batch_size
+        self._loaded = {}
+        self._failed = set()
+        self._load_lock = threading.Lock()
+
+    def supports(self, source_lang: str, target_lang: str) -> bool:
+        pair = self._pair(source_lang, target_lang)
+        return pair in self.models and pair not in self._failed
+
+    def translate_batch(self, texts: List[str], source_lang: str, target_lang: str) -> List[str]:
+        pair = self._pair(source_lang, target_lang)
+        with self._load_lock:
+            if pair in self._failed:
+                raise RuntimeError(f"Local model for {pair[0]}-{pair[1]} failed to load")
+            if pair not in self._loaded:
+                try:
+                    self._loaded[pair] = self._load(self.models[pair])
+                except Exception:
+                    self._failed.add(pair)
+                    raise
+        translate = self._loaded[pair]
+
+        translations = []
+        for start in range(0, len(texts), self.batch_size):
+            translations.extend(translate(texts[start:start + self.batch_size]))
+        return translations
+
+    @staticmethod
+    def _pair(source_lang: str, target_lang: str) -> Tuple[str, str]:
+        return (AUTO_SOURCE_LANG if source_lang == "auto" else source_lang, target_lang)
+
+    @staticmethod
+    def _load(model_path: str):
+        """
+        Load a model and return a function translating one batch of texts.
+        """
+        from transformers import AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(model_path)
+
+        if os.path.isfile(os.path.join(model_path, "model.bin")):
+            import ctranslate2
+
+            translator = ctranslate2.Translator(model_path, device="cpu", compute_type="int8")
+
+            def translate(texts: List[str]) -> List[str]:
+                tokens = [tokenizer.convert_ids_to_tokens(tokenizer.encode(text)) for text in texts]
+                results = translator.translate_batch(tokens)
+                return [
+                    tokenizer.decode(tokenizer.convert_tokens_to_ids(result.hypotheses[0]), skip_special_tokens=True)
+                    for result in results
+                ]
+
+            return translate
+
+        import torch
+        from transformers import AutoModelForSeq2SeqLM
+
+        model = AutoModelForSeq2SeqLM.from_pretrained(model_path).eval()
+
+        def translate(texts: List[str]) -> List[str]:
+            inputs = tokenizer(texts, return_tensors="pt", padding=True, truncation=True)
+            with torch.inference_mode():
+                outputs = model.generate(**inputs)
+            return tokenizer.batch_decode(outputs, skip_special_tokens=True)
+
+        return translate
+
+
+def _parse_local_models(config: str) -> Dict[Tuple[str, str], str]:
+    """
+    Parse "ja-en=path,ja-pt=path" into {("ja", "en"): path, ("ja", "pt"): path}.
+    """
+    models = {}
+    for entry in filter(None, (item.strip() for item in config.split(","))):
+        pair, model_path = entry.split("=", 1)
+        source_lang, target_lang = pair.strip().split("-", 1)
+        models[(source_lang, target_lang)] = model_path.strip()
+    return models
+
+
+@lru_cache(maxsize=None)
+def get_backends() -> List[TranslatorBackend]:
+    """
+    Build the configured backends once, in fallback order.
+    """
+    factories = {
+        "local": lambda: LocalBackend(_parse_local_models(
+            os.environ.get("LOCAL_TRANSLATOR_MODELS", DEFAULT_LOCAL_MODELS))),
+        "microsoft": lambda: MicrosoftBackend(os.environ.get("MICROSOFT_API_KEY", ""),
+            os.environ.get("MICROSOFT_REGION", "brazilsouth"),
+            float(os.environ.get("MICROSOFT_CHARS_PER_MINUTE", MICROSOFT_CHARS_PER_MINUTE))),
+        "google": lambda: GoogleBackend(
+            float(os.environ.get("GOOGLE_REQUESTS_PER_MINUTE", GOOGLE_REQUESTS_PER_MINUTE))),
+    }
+
+    names = os.environ.get("TRANSLATOR_BACKENDS", DEFAULT_BACKENDS)
+    backends = []
+    for name in filter(None, (item.strip().lower() for item in names.split(","))):
+        if name not in factories:
+            raise ValueError(f"Unknown translator backend: {name}")
+        backends.append(factories[name]())
+    return backends
@@ -0,0 +1,194 @@
+"""
+This module contains the shared client used by the remote translator backends:
+a pooled HTTP session, a token-bucket rate limiter, jittered retries and a circuit breaker.
+"""
+import random
+import threading
+import time
+from functools import lru_cache
+from typing import Callable, Optional, TypeVar
+import requests
+from requests.adapters import HTTPAdapter
+
+T = TypeVar("T")
+
+POOL_SIZE = 16
+MAX_RETRIES = 3
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 8.0
+# A longer Retry-After fails the call at once so the caller can fall back to another backend
+RETRY_AFTER_MAX = 8.0
+RATE_LIMIT_TIMEOUT = 10.0
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_TIMEOUT = 30.0
+
+
+class TranslatorUnavailableError(RuntimeError):
+    """Raised when a call is refused by the circuit breaker or the rate limiter."""
+
+
+class TransientTranslatorError(RuntimeError):
+    """Raised for failures worth retrying, such as HTTP 429 and 5xx responses."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Tokens are refilled continuously at `rate` per second
+    up to `capacity`, so short bursts are allowed while the average stays at the quota.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1, timeout: float = RATE_LIMIT_TIMEOUT) -> bool:
+        """
+        Take `tokens` from the bucket, waiting up to `timeout` seconds for them to refill.
+        Requests larger than the capacity are clamped so they can still go through.
+        """
+        tokens = min(tokens, self.capacity)
+        deadline = time.monotonic() + timeout
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing service. After `failure_threshold` consecutive failures the
+    circuit opens and calls are refused for `reset_timeout` seconds; then a single
+    trial call is let through, closing the circuit again if it succeeds.
+    """
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, reset_timeout: float = BREAKER_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def release(self) -> None:
+        """
+        Give back a trial call that was allowed but never made.
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+@lru_cache(maxsize=None)
+def get_shared_session() -> requests.Session:
+    """
+    Return the process-wide HTTP session, keeping connections alive between calls.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def is_retryable(error: Exception) -> bool:
+    return isinstance(error, (TransientTranslatorError, requests.ConnectionError, requests.Timeout))
+
+
+class TranslatorClient:
+    """
+    Wraps calls to a remote translator with rate limiting, retries and a circuit breaker.
+    One client is shared by every request that uses the same backend.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        limiter: Optional[TokenBucket] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        retryable: Callable[[Exception], bool] = is_retryable,
+        max_retries: int = MAX_RETRIES,
+    ):
+        self.name = name
+        self.limiter = limiter
+        self.breaker = breaker or CircuitBreaker()
+        self.retryable = retryable
+        self.max_retries = max_retries
+        self.session = get_shared_session()
+
+    def call(self, fn: Callable[[], T], cost: float = 1) -> T:
+        """
+        Run `fn`, spending `cost` tokens from the rate limiter for every attempt.
+        The circuit breaker counts the whole call, retries included, as one failure.
+        """
+        for attempt in range(self.max_retries + 1):
+            # An open circuit refuses the call before any token is spent or waited for
+            if attempt == 0 and not self.breaker.allow():
+                raise TranslatorUnavailableError(f"{self.name}: circuit open")
+            if self.limiter is not None and not self.limiter.acquire(cost):
+                # A quota wait is not a service failure, unless an earlier attempt already failed
+                if attempt > 0:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.release()
+                raise TranslatorUnavailableError(f"{self.name}: rate limit wait exceeded")
+
+            try:
+                result = fn()
+            except Exception as e:
+                retry_after = getattr(e, "retry_after", None)
+                if attempt == self.max_retries or not self.retryable(e) or (retry_after or 0) > RETRY_AFTER_MAX:
+                    self.breaker.record_failure()
+                    raise
+                time.sleep(self._backoff(attempt, retry_after))
+                continue
+
+            self.breaker.record_success()
+            return result
+
+    @staticmethod
+    def _backoff(attempt: int, retry_after: Optional[float]) -> float:
+        """
+        Full-jitter exponential backoff, never shorter than the server's Retry-After,
+        which call() has already capped at RETRY_AFTER_MAX.
+        """
+        delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+        return max(delay, retry_after or 0)